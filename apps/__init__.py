@@ -4,6 +4,7 @@ from apps.content import content_router
 from apps.users_actions import actions_router
 from apps.device_management import device_router
 from apps.synchronization import sync_router
+from apps.monitoring import monitoring_router, metrics_router
 
 
 __all__ = [
@@ -13,4 +14,6 @@ __all__ = [
     "actions_router",
     "device_router",
     "sync_router",
+    "monitoring_router",
+    "metrics_router",
 ]
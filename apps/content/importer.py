@@ -0,0 +1,289 @@
+import os
+import csv
+import json
+import time
+import asyncio
+import logging
+from itertools import islice
+from collections import defaultdict, deque
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+
+from utils.cache import invalidate_catalogue
+from apps.content.schemas import ContentBase
+from models.upsert import insert_ignore_statement
+from models import async_session, Content, Genre, content_genre_association
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# per row errors listed in the report, any further ones are only counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+# separates the genre names of a row in csv files
+CSV_GENRE_SEPARATOR = "|"
+
+ImportFormat = Literal["ndjson", "csv"]
+
+
+def import_format_of(filename: Optional[str]) -> ImportFormat:
+    return "csv" if filename and filename.lower().endswith(".csv") else "ndjson"
+
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, e
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    """
+    header row with title,duration,available,genres, genres are names separated by
+    CSV_GENRE_SEPARATOR, empty cells are left out so the schema defaults apply
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        row = {
+            key: value.strip()
+            for key, value in row.items()
+            if key and isinstance(value, str) and value.strip()
+        }
+        if row.get("duration", "").isdigit():
+            row["duration"] = int(row["duration"])
+        if "genres" in row:
+            row["genres"] = [
+                genre.strip()
+                for genre in row["genres"].split(CSV_GENRE_SEPARATOR)
+                if genre.strip()
+            ]
+        yield reader.line_num, row
+
+
+def read_rows(lines: Iterable[str], import_format: ImportFormat):
+    return read_csv(lines) if import_format == "csv" else read_ndjson(lines)
+
+
+async def insert_content(session, rows: List[dict]) -> List[int]:
+    """
+    inserts the rows and returns their ids in the same order, as a single executemany
+    with RETURNING where the database has it (sqlite, mariadb), mysql has no
+    RETURNING so there it is one multi-row INSERT and the ids are selected back
+    """
+    table = Content.__table__
+    if session.bind.dialect.insert_executemany_returning_sort_by_parameter_order:
+        result = await session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        )
+        return list(result.scalars())
+    if session.bind.dialect.name == "mysql":
+        return await insert_content_batch(session, rows)
+    content_ids = []
+    for row in rows:
+        result = await session.execute(insert(table), row)
+        content_ids.append(result.inserted_primary_key[0])
+    return content_ids
+
+
+async def insert_content_batch(session, rows: List[dict]) -> List[int]:
+    """
+    one INSERT for all the rows, LAST_INSERT_ID() is the id of its first row and the
+    ids are selected back by title from there on, mysql assigns them in row order so
+    rows sharing a title get theirs in that order too
+    """
+    table = Content.__table__
+    result = await session.execute(insert(table).values(rows))
+    first_id = result.lastrowid
+    inserted = await session.execute(
+        select(table.c.id, table.c.title)
+        .filter(
+            table.c.id >= first_id,
+            table.c.title.in_({row["title"] for row in rows}),
+        )
+        .order_by(table.c.id)
+    )
+    ids_by_title = defaultdict(deque)
+    for content_id, title in inserted:
+        ids_by_title[title].append(content_id)
+    try:
+        return [ids_by_title[row["title"]].popleft() for row in rows]
+    except IndexError:
+        # rolls the chunk back rather than linking genres to the wrong content
+        raise RuntimeError("could not select back the ids of the inserted content")
+
+
+class CatalogueImport:
+    """
+    validates rows with ContentBase and writes them in chunks of `chunk_size`, one
+    transaction per chunk, genres are given by id (ndjson integers) or by name and
+    names are resolved through a name -> id map loaded once per import
+    """
+
+    def __init__(
+        self, create_genres: bool = False, chunk_size: int = IMPORT_CHUNK_SIZE
+    ):
+        self.create_genres = create_genres
+        self.chunk_size = chunk_size
+        self.genre_ids: Dict[str, int] = {}
+        self.known_genre_ids = set()
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.genres_created = 0
+        self.seconds = 0.0
+        self.errors = []
+
+    async def run(self, rows: Iterable[Tuple[int, object]]) -> dict:
+        started = time.perf_counter()
+        await self.load_genres()
+        rows = iter(rows)
+        # reading, parsing and validating the rows runs in a thread, so an upload
+        # being imported doesn't hold up the other requests on the event loop
+        while True:
+            chunk = await asyncio.to_thread(self.read_chunk, rows)
+            if not chunk:
+                break
+            await self.import_chunk(chunk)
+        self.seconds = time.perf_counter() - started
+        if self.imported:
+            invalidate_catalogue()
+        logger.info(
+            f"Imported {self.imported}/{self.rows} content rows in {self.seconds:.1f}s"
+        )
+        return self.report()
+
+    def read_chunk(self, rows: Iterator[Tuple[int, object]]):
+        chunk = list(islice(rows, self.chunk_size))
+        self.rows += len(chunk)
+        return chunk
+
+    def report(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "genres_created": self.genres_created,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": (
+                round(self.imported / self.seconds, 1) if self.seconds else 0
+            ),
+            "errors": self.errors,
+        }
+
+    def add_error(self, line_number: int, errors: List[str]):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line_number, "errors": errors})
+
+    async def load_genres(self, names: Optional[List[str]] = None):
+        async with async_session() as session:
+            query = select(Genre.id, Genre.name)
+            if names is not None:
+                query = query.filter(Genre.name.in_(names))
+            rows = await session.execute(query)
+        for genre_id, name in rows:
+            self.known_genre_ids.add(genre_id)
+            if name is not None:
+                self.genre_ids.setdefault(name.lower(), genre_id)
+
+    async def add_missing_genres(self, chunk):
+        missing = {}
+        for _, row in chunk:
+            genres = row.get("genres") if isinstance(row, dict) else None
+            if not isinstance(genres, list):
+                continue
+            for genre in genres:
+                if isinstance(genre, str) and genre.strip():
+                    name = genre.strip()
+                    if name.lower() not in self.genre_ids:
+                        missing.setdefault(name.lower(), name)
+        if not missing:
+            return
+        async with async_session() as session:
+            await session.execute(
+                insert_ignore_statement(session.bind.dialect.name, Genre.__table__),
+                [{"name": name} for name in missing.values()],
+            )
+            await session.commit()
+        known = len(self.genre_ids)
+        await self.load_genres(list(missing.values()))
+        self.genres_created += len(self.genre_ids) - known
+
+    def validate(self, line_number: int, row) -> Optional[ContentBase]:
+        if isinstance(row, Exception):
+            self.add_error(line_number, [f"{row.__class__.__name__}:{row}"])
+            return None
+        if not isinstance(row, dict):
+            self.add_error(line_number, ["row must be an object"])
+            return None
+        genres = row.get("genres") or []
+        if not isinstance(genres, list):
+            self.add_error(line_number, ["genres: must be a list"])
+            return None
+        genre_ids, unknown = [], []
+        for genre in genres:
+            if isinstance(genre, str):
+                genre_id = self.genre_ids.get(genre.strip().lower())
+            elif isinstance(genre, int) and genre in self.known_genre_ids:
+                genre_id = genre
+            else:
+                genre_id = None
+            if genre_id is None:
+                unknown.append(str(genre))
+            else:
+                genre_ids.append(genre_id)
+        if unknown:
+            self.add_error(
+                line_number, [f"genres: unknown genres {', '.join(unknown)}"]
+            )
+            return None
+        try:
+            return ContentBase(**{**row, "genres": list(dict.fromkeys(genre_ids))})
+        except ValidationError as e:
+            self.add_error(
+                line_number,
+                [
+                    f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                    for error in e.errors()
+                ],
+            )
+            return None
+
+    def validate_chunk(self, chunk: List[Tuple[int, object]]):
+        valid = []
+        for line_number, row in chunk:
+            content = self.validate(line_number, row)
+            if content is not None:
+                valid.append((line_number, content))
+        return valid
+
+    async def import_chunk(self, chunk: List[Tuple[int, object]]):
+        if self.create_genres:
+            await self.add_missing_genres(chunk)
+        valid = await asyncio.to_thread(self.validate_chunk, chunk)
+        if not valid:
+            return
+        try:
+            async with async_session() as session:
+                content_ids = await insert_content(
+                    session,
+                    [content.model_dump(exclude={"genres"}) for _, content in valid],
+                )
+                genre_rows = [
+                    {"content_id": content_id, "genre_id": genre_id}
+                    for content_id, (_, content) in zip(content_ids, valid)
+                    for genre_id in content.genres
+                ]
+                if genre_rows:
+                    await session.execute(insert(content_genre_association), genre_rows)
+                await session.commit()
+            self.imported += len(valid)
+        except Exception as e:
+            logger.error(f"Error importing content: {e.__class__.__name__}:{e}")
+            for line_number, _ in valid:
+                self.add_error(line_number, [f"{e.__class__.__name__}:{e}"])
@@ -1,50 +1,241 @@
-import re
+import io
+import logging
 from http import HTTPStatus
 from typing import Optional, Annotated, List
 
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session, joinedload
-from fastapi import APIRouter, Response, Depends
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from fastapi import APIRouter, Request, Response, Depends, Query, UploadFile
 
-from models import engine, Content, Genre
 from utils.response import ReturnResponse
 from auth import is_admin, is_user, FullUser
+from utils.cache import catalogue_cache, invalidate_catalogue
+from utils.cache.http import render_ok, cached_response
+from utils.time_format import TimeFormat, format_seconds
+from models import async_session, Content, Genre, content_genre_association
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, split_page
+from apps.content.schemas import ContentBase
+from apps.content.search import title_index, search_titles_in_database
+from apps.content.importer import (
+    CatalogueImport,
+    ImportFormat,
+    import_format_of,
+    read_rows,
+)
 
 content_router = APIRouter(prefix="/content", tags=["content"])
+logger = logging.getLogger(f"TV_backend.{__name__}")
 
 
-class ContentBase(BaseModel):
-    title: str
-    duration: Annotated[
-        str, Field(pattern=re.compile(r"^(?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d$"))
-    ]
-    available: Optional[bool] = True
-    genres: Optional[List[int]] = []
+CONTENT_FIELDS = ("id", "title", "duration", "available", "genres")
+
+
+def parse_content_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(CONTENT_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in CONTENT_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    # id is always returned, it is the pagination cursor
+    return ["id"] + [field for field in dict.fromkeys(requested) if field != "id"]
+
+
+async def get_content_genres(session, content_ids: List[int]):
+    content_genres = {content_id: [] for content_id in content_ids}
+    if not content_ids:
+        return content_genres
+    rows = await session.execute(
+        select(content_genre_association.c.content_id, Genre.id, Genre.name)
+        .join(Genre, Genre.id == content_genre_association.c.genre_id)
+        .filter(content_genre_association.c.content_id.in_(content_ids))
+    )
+    for content_id, genre_id, genre_name in rows:
+        content_genres[content_id].append({"id": genre_id, "name": genre_name})
+    return content_genres
+
+
+def content_to_dict(content: Content, time_format: TimeFormat):
+    return {
+        "id": content.id,
+        "title": content.title,
+        "duration": format_seconds(content.duration, time_format),
+        "available": content.available,
+        "genres": [{"id": genre.id, "name": genre.name} for genre in content.genres],
+    }
+
+
+async def load_content_page(
+    after: Optional[int],
+    limit: int,
+    selected_fields: List[str],
+    time_format: TimeFormat,
+    genre: Optional[int] = None,
+    available: Optional[bool] = None,
+):
+    async with async_session() as session:
+        columns = [
+            getattr(Content, field) for field in selected_fields if field != "genres"
+        ]
+        query = select(*columns)
+        key_column = Content.id
+        if genre is not None:
+            # pages through the (genre_id, content_id) primary key of the association
+            # table, one genre is a range scan of that index
+            key_column = content_genre_association.c.content_id
+            query = query.join(
+                content_genre_association,
+                content_genre_association.c.content_id == Content.id,
+            ).filter(content_genre_association.c.genre_id == genre)
+        if available is not None:
+            # a plain comparison so mysql can range scan ix_content_available
+            query = query.filter(Content.available == available)
+        rows = await session.execute(keyset_page(query, key_column, after, limit))
+        rows, next_cursor = split_page(rows.all(), Content.id, limit)
+        content = [row._asdict() for row in rows]
+        if "duration" in selected_fields and time_format != "seconds":
+            for row in content:
+                row["duration"] = format_seconds(row["duration"], time_format)
+        if "genres" in selected_fields:
+            content_genres = await get_content_genres(
+                session, [row["id"] for row in content]
+            )
+            for row in content:
+                row["genres"] = content_genres[row["id"]]
+        return {"content": content, "next_cursor": next_cursor}
+
+
+def content_page_key(
+    available: Optional[bool],
+    genre: Optional[int],
+    after: Optional[int],
+    limit: int,
+    selected_fields: List[str],
+    time_format: TimeFormat,
+):
+    return (
+        "content",
+        available,
+        genre,
+        after,
+        limit,
+        tuple(selected_fields),
+        time_format,
+    )
+
+
+async def warm_available_catalogue():
+    """
+    precomputes the first page of the available catalogue, the request every box
+    makes on start, so it is served from the cache right away
+    """
+    selected_fields = list(CONTENT_FIELDS)
+    try:
+        await catalogue_cache.get_or_load_async(
+            content_page_key(
+                True, None, None, DEFAULT_PAGE_SIZE, selected_fields, "hms"
+            ),
+            lambda: render_ok(
+                lambda: load_content_page(
+                    None, DEFAULT_PAGE_SIZE, selected_fields, "hms", available=True
+                )
+            ),
+        )
+    except Exception as e:
+        logger.error(f"Error warming the catalogue: {e.__class__.__name__}:{e}")
+
+
+async def refresh_catalogue():
+    """after a content write the handler already patched into the title index"""
+    version = invalidate_catalogue()
+    if version is not None:
+        title_index.patched(version)
+    await warm_available_catalogue()
+
+
+async def load_content_by_id(content_id: int, time_format: TimeFormat):
+    async with async_session() as session:
+        content = await session.get(
+            Content, content_id, options=[selectinload(Content.genres)]
+        )
+        return content_to_dict(content, time_format) if content else None
 
 
 @content_router.get("/")
-def get_content(
+async def get_content(
+    request: Request,
     response: Response,
     current_user: Annotated[FullUser, Depends(is_user)],
     only_available: bool = False,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    time_format: TimeFormat = "hms",
+    genre: Optional[int] = None,
+    available: Optional[bool] = None,
 ):
     try:
-        with Session(engine) as session:
-            if only_available:
-                content = (
-                    session.query(Content)
-                    .options(joinedload(Content.genres))
-                    .filter(Content.available is True)
-                    .all()
-                )
-            else:
-                content = (
-                    session.query(Content).options(joinedload(Content.genres)).all()
+        selected_fields = parse_content_fields(fields)
+    except ValueError as e:
+        response.status_code = HTTPStatus.BAD_REQUEST.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            is_success=False,
+            errors=[str(e)],
+        )
+    if only_available:
+        available = True
+    try:
+        # only_available=true and available=true share one cached view, the body is
+        # cached rendered so a matching If-None-Match costs no query or encoding
+        content_page = await catalogue_cache.get_or_load_async(
+            content_page_key(
+                available, genre, after, limit, selected_fields, time_format
+            ),
+            lambda: render_ok(
+                lambda: load_content_page(
+                    after,
+                    limit,
+                    selected_fields,
+                    time_format,
+                    genre=genre,
+                    available=available,
                 )
-            response.status_code = HTTPStatus.OK.value
-            return ReturnResponse.return_response(
-                status_code=HTTPStatus.OK.value, is_success=True, data=content
-            )
+            ),
+        )
+        return await cached_response(request, content_page)
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+@content_router.get("/search")
+async def search_content(
+    response: Response,
+    current_user: Annotated[FullUser, Depends(is_user)],
+    q: Annotated[str, Query(min_length=1, max_length=100)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    available: Optional[bool] = None,
+):
+    """
+    title search and typeahead, the last word may be incomplete, answered from the
+    worker's in-process title index and from the database until it is built
+    """
+    try:
+        # also retries a build that failed, e.g. at a worker start with the db down
+        title_index.refresh_if_stale()
+        if title_index.ready:
+            results = title_index.search(q, limit, available)
+        else:
+            results = await search_titles_in_database(q, limit, available)
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value, is_success=True, data=results
+        )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -55,30 +246,27 @@ def get_content(
 
 
 @content_router.get("/{content_id}")
-def get_content_by_id(
+async def get_content_by_id(
+    request: Request,
     content_id: int,
     current_user: Annotated[FullUser, Depends(is_user)],
     response: Response,
+    time_format: TimeFormat = "hms",
 ):
     try:
-        with Session(engine) as session:
-            content = (
-                session.query(Content)
-                .options(joinedload(Content.genres))
-                .get(content_id)
+        content = await catalogue_cache.get_or_load_async(
+            ("content", content_id, time_format),
+            lambda: render_ok(lambda: load_content_by_id(content_id, time_format)),
+        )
+        if content:
+            return await cached_response(request, content)
+        else:
+            response.status_code = HTTPStatus.NOT_FOUND.value
+            return ReturnResponse.return_response(
+                status_code=HTTPStatus.NOT_FOUND.value,
+                is_success=False,
+                errors=["Content not found"],
             )
-            if content:
-                response.status_code = HTTPStatus.OK.value
-                return ReturnResponse.return_response(
-                    status_code=HTTPStatus.OK.value, is_success=True, data=content
-                )
-            else:
-                response.status_code = HTTPStatus.NOT_FOUND.value
-                return ReturnResponse.return_response(
-                    status_code=HTTPStatus.NOT_FOUND.value,
-                    is_success=False,
-                    errors=["Content not found"],
-                )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -89,7 +277,7 @@ def get_content_by_id(
 
 
 @content_router.post("/")
-def create_content(
+async def create_content(
     content: ContentBase,
     current_user: Annotated[FullUser, Depends(is_admin)],
     response: Response,
@@ -97,9 +285,11 @@ def create_content(
     content = content.dict()
     genres = content.pop("genres")
     try:
-        with Session(engine) as session:
+        async with async_session() as session:
             if genres:
-                actual_genres = session.query(Genre).filter(Genre.id.in_(genres)).all()
+                actual_genres = (
+                    await session.scalars(select(Genre).filter(Genre.id.in_(genres)))
+                ).all()
             if genres and not actual_genres:
                 response.status_code = HTTPStatus.BAD_REQUEST.value
                 return ReturnResponse.return_response(
@@ -110,7 +300,9 @@ def create_content(
             new_content = Content(**content)
             new_content.genres = actual_genres
             session.add(new_content)
-            session.commit()
+            await session.commit()
+            title_index.put(new_content.id, new_content.title, new_content.available)
+            await refresh_catalogue()
             response.status_code = HTTPStatus.CREATED.value
             return ReturnResponse.return_response(
                 status_code=HTTPStatus.CREATED.value,
@@ -126,8 +318,41 @@ def create_content(
         )
 
 
+@content_router.post("/import")
+async def import_content(
+    file: UploadFile,
+    current_user: Annotated[FullUser, Depends(is_admin)],
+    response: Response,
+    file_format: Optional[ImportFormat] = None,
+    create_genres: bool = False,
+):
+    """
+    bulk loads an ndjson (one ContentBase object per line) or csv upload, the format
+    follows the file name unless file_format is given, returns the import report
+    """
+    try:
+        lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        report = await CatalogueImport(create_genres=create_genres).run(
+            read_rows(lines, file_format or import_format_of(file.filename))
+        )
+        if report["imported"]:
+            await warm_available_catalogue()
+            title_index.refresh_if_stale()
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value, is_success=True, data=report
+        )
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
 @content_router.put("/{content_id}")
-def update_content(
+async def update_content(
     content_id: int,
     current_user: Annotated[FullUser, Depends(is_admin)],
     content: ContentBase,
@@ -136,14 +361,22 @@ def update_content(
     content = content.dict()
     genres = content.pop("genres")
     try:
-        with Session(engine) as session:
-            genres = session.query(Genre).filter(Genre.id.in_(genres)).all()
-            content_to_update = session.get(Content, content_id)
+        async with async_session() as session:
+            genres = (
+                await session.scalars(select(Genre).filter(Genre.id.in_(genres)))
+            ).all()
+            content_to_update = await session.get(
+                Content, content_id, options=[selectinload(Content.genres)]
+            )
             if content_to_update:
                 for key, value in content.items():
                     setattr(content_to_update, key, value)
                 content_to_update.genres = genres
-                session.commit()
+                await session.commit()
+                title_index.put(
+                    content_id, content_to_update.title, content_to_update.available
+                )
+                await refresh_catalogue()
                 response.status_code = HTTPStatus.OK.value
                 return ReturnResponse.return_response(
                     status_code=HTTPStatus.OK.value,
@@ -167,17 +400,19 @@ def update_content(
 
 
 @content_router.delete("/{content_id}")
-def delete_content(
+async def delete_content(
     content_id: int,
     current_user: Annotated[FullUser, Depends(is_admin)],
     response: Response,
 ):
     try:
-        with Session(engine) as session:
-            content_to_delete = session.get(Content, content_id)
+        async with async_session() as session:
+            content_to_delete = await session.get(Content, content_id)
             if content_to_delete:
-                session.delete(content_to_delete)
-                session.commit()
+                await session.delete(content_to_delete)
+                await session.commit()
+                title_index.remove(content_id)
+                await refresh_catalogue()
                 response.status_code = HTTPStatus.OK.value
                 return ReturnResponse.return_response(
                     status_code=HTTPStatus.OK.value,
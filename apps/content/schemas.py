@@ -0,0 +1,13 @@
+from typing import Optional, List
+
+from pydantic import BaseModel
+
+from utils.time_format import Seconds
+
+
+class ContentBase(BaseModel):
+    title: str
+    # HH:MM:SS or seconds, stored as seconds
+    duration: Seconds
+    available: Optional[bool] = True
+    genres: Optional[List[int]] = []
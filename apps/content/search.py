@@ -0,0 +1,131 @@
+import os
+import asyncio
+import logging
+from typing import List, Optional
+
+from sqlalchemy import select, and_
+from sqlalchemy.dialects import mysql
+
+from utils.search import InvertedIndex, tokenize
+from utils.cache import catalogue_cache
+from models import async_session, Content
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+# "false" always searches the database, for workers that can't spare the memory
+CONTENT_SEARCH_INDEX = os.getenv("CONTENT_SEARCH_INDEX", "true").lower() == "true"
+
+
+def build_index(rows) -> InvertedIndex:
+    index = InvertedIndex()
+    for content_id, title, available in rows:
+        index.add(content_id, title, available)
+    return index
+
+
+class TitleIndex:
+    """
+    inverted index over Content.title, built at worker start and patched by this
+    worker's content handlers, writes made by other workers or the import cli bump
+    the catalogue version and the index is rebuilt in the background meanwhile
+    answering from the previous build
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.index: Optional[InvertedIndex] = None
+        self.version = None
+        self._rebuild: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self.index is not None
+
+    async def build(self):
+        if not self.enabled:
+            return
+        version = catalogue_cache.version.current()
+        async with async_session() as session:
+            rows = (
+                await session.execute(
+                    select(Content.id, Content.title, Content.available)
+                )
+            ).all()
+        # tokenizing the whole catalogue takes a while, keep the event loop going
+        index = await asyncio.to_thread(build_index, rows)
+        self.index = index
+        self.version = version
+        logger.info(f"Built the content title index, {len(index)} titles")
+
+    async def _build_logged(self):
+        try:
+            await self.build()
+        except Exception as e:
+            logger.error(f"Error building title index: {e.__class__.__name__}:{e}")
+
+    def refresh_if_stale(self):
+        if not self.enabled or catalogue_cache.version.current() == self.version:
+            return
+        if self._rebuild is None or self._rebuild.done():
+            self._rebuild = asyncio.get_running_loop().create_task(self._build_logged())
+
+    def patched(self, version: int):
+        """
+        takes the catalogue version this worker bumped after patching the index, so
+        its own write doesn't rebuild it, unless another process bumped in between
+        """
+        if self.version is not None and self.version == version - 1:
+            self.version = version
+
+    def put(self, content_id: int, title: str, available: Optional[bool]):
+        if self.index is not None:
+            self.index.add(content_id, title, available)
+
+    def remove(self, content_id: int):
+        if self.index is not None:
+            self.index.remove(content_id)
+
+    def search(self, query: str, limit: int, available: Optional[bool]) -> List[dict]:
+        accept = None if available is None else (lambda payload: payload == available)
+        return [
+            {"id": content_id, "title": title, "available": payload}
+            for content_id, title, payload in self.index.search(query, limit, accept)
+        ]
+
+
+async def search_titles_in_database(
+    query: str, limit: int, available: Optional[bool]
+) -> List[dict]:
+    """
+    fallback while the index is not built or disabled, MATCH .. AGAINST over the
+    ix_content_title_fulltext index on mysql, LIKE on other databases
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    async with async_session() as session:
+        if session.bind.dialect.name == "mysql":
+            relevance = mysql.match(
+                Content.title, against=" ".join(f"+{token}*" for token in tokens)
+            ).in_boolean_mode()
+            statement = (
+                select(Content.id, Content.title, Content.available)
+                .filter(relevance)
+                .order_by(relevance.desc(), Content.id)
+            )
+        else:
+            statement = (
+                select(Content.id, Content.title, Content.available)
+                .filter(and_(*(Content.title.ilike(f"%{token}%") for token in tokens)))
+                .order_by(Content.id)
+            )
+        if available is not None:
+            statement = statement.filter(Content.available == available)
+        rows = await session.execute(statement.limit(limit))
+        return [
+            {"id": content_id, "title": title, "available": content_available}
+            for content_id, title, content_available in rows
+        ]
+
+
+title_index = TitleIndex(enabled=CONTENT_SEARCH_INDEX)
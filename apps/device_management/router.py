@@ -2,15 +2,18 @@ from http import HTTPStatus
 from typing import Annotated
 
 import sqlalchemy
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, Response, Depends
 from pydantic_extra_types.mac_address import MacAddress
 
 from auth import FullUser, is_user
-from utils.response import ReturnResponse
-from models import engine, User, Device, Session
+from utils.response import ReturnResponse, object_mapper
+from models import async_session, User, Device
 
 device_router = APIRouter(prefix="/devices", tags=["device"])
+device_to_dict = object_mapper("id", "timezone", "mac_address", "language", "user_id")
 
 
 class DeviceData(BaseModel):
@@ -20,13 +23,17 @@ class DeviceData(BaseModel):
 
 
 @device_router.get("/")
-def get_devices(
+async def get_devices(
     response: Response, current_user: Annotated[FullUser, Depends(is_user)]
 ):
     try:
-        with Session(engine) as session:
-            user = session.query(User).filter_by(id=current_user.id).first()
-            devices = user.devices
+        async with async_session() as session:
+            user = await session.scalar(
+                select(User)
+                .options(selectinload(User.devices))
+                .filter_by(id=current_user.id)
+            )
+            devices = [device_to_dict(device) for device in user.devices]
             response.status_code = HTTPStatus.OK.value
             return ReturnResponse.return_response(
                 status_code=HTTPStatus.OK.value, is_success=True, data=devices
@@ -41,17 +48,21 @@ def get_devices(
 
 
 @device_router.post("/")
-def attach_device_to_user(
+async def attach_device_to_user(
     response: Response,
     device_data: DeviceData,
     current_user: Annotated[FullUser, Depends(is_user)],
 ):
     try:
-        with Session(engine) as session:
-            user = session.query(User).filter_by(id=current_user.id).first()
+        async with async_session() as session:
+            user = await session.scalar(
+                select(User)
+                .options(selectinload(User.devices))
+                .filter_by(id=current_user.id)
+            )
             device = Device(**device_data.dict())
             user.devices.append(device)
-            session.commit()
+            await session.commit()
             response.status_code = HTTPStatus.CREATED.value
             return ReturnResponse.return_response(
                 status_code=HTTPStatus.CREATED.value,
@@ -79,15 +90,19 @@ def attach_device_to_user(
 
 
 @device_router.delete("/{device_id}")
-def delete_device(
+async def delete_device(
     response: Response,
     device_id: int,
     current_user: Annotated[FullUser, Depends(is_user)],
 ):
     try:
-        with Session(engine) as session:
-            user = session.query(User).filter_by(id=current_user.id).first()
-            device = session.query(Device).filter_by(id=device_id).first()
+        async with async_session() as session:
+            user = await session.scalar(
+                select(User)
+                .options(selectinload(User.devices))
+                .filter_by(id=current_user.id)
+            )
+            device = await session.scalar(select(Device).filter_by(id=device_id))
             if not device:
                 response.status_code = HTTPStatus.NOT_FOUND.value
                 return ReturnResponse.return_response(
@@ -103,7 +118,7 @@ def delete_device(
                     errors=["You can't delete another user's device"],
                 )
             user.devices.remove(device)
-            session.commit()
+            await session.commit()
             response.status_code = HTTPStatus.OK.value
             return ReturnResponse.return_response(
                 status_code=HTTPStatus.OK.value,
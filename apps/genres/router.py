@@ -1,26 +1,114 @@
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Optional, List
 
 import sqlalchemy.exc
+from sqlalchemy import select
 from pydantic import BaseModel, Field
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Request, Response, Depends, Query
 
-from models import engine, Genre
-from sqlalchemy.orm import Session
+from auth import is_user, FullUser
+from models import async_session, Genre
 from utils.response import ReturnResponse
+from utils.time_format import TimeFormat
+from utils.cache import catalogue_cache, invalidate_catalogue
+from utils.cache.http import render_ok, cached_response
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from apps.content.router import load_content_page, parse_content_fields
 
 genres_router = APIRouter(prefix="/genres", tags=["genres"])
 
 
+async def load_genres():
+    async with async_session() as session:
+        return [
+            {"id": genre_id, "name": name}
+            for genre_id, name in await session.execute(select(Genre.id, Genre.name))
+        ]
+
+
 @genres_router.get("/")
-def get_genres(response: Response):
+async def get_genres(request: Request, response: Response):
     try:
-        with Session(engine) as session:
-            genres = session.query(Genre).all()
-            response.status_code = HTTPStatus.OK.value
+        genres = await catalogue_cache.get_or_load_async(
+            ("genres",), lambda: render_ok(load_genres)
+        )
+        return await cached_response(request, genres)
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+async def load_genre_content(
+    genre_id: int,
+    available: Optional[bool],
+    after: Optional[int],
+    limit: int,
+    selected_fields: List[str],
+    time_format: TimeFormat,
+):
+    async with async_session() as session:
+        if await session.get(Genre, genre_id) is None:
+            return None
+    return await load_content_page(
+        after,
+        limit,
+        selected_fields,
+        time_format,
+        genre=genre_id,
+        available=available,
+    )
+
+
+@genres_router.get("/{genre_id}/content")
+async def get_genre_content(
+    request: Request,
+    genre_id: int,
+    response: Response,
+    current_user: Annotated[FullUser, Depends(is_user)],
+    available: Optional[bool] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    time_format: TimeFormat = "hms",
+):
+    try:
+        selected_fields = parse_content_fields(fields)
+    except ValueError as e:
+        response.status_code = HTTPStatus.BAD_REQUEST.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            is_success=False,
+            errors=[str(e)],
+        )
+    try:
+        content_page = await catalogue_cache.get_or_load_async(
+            (
+                "genre_content",
+                genre_id,
+                available,
+                after,
+                limit,
+                tuple(selected_fields),
+                time_format,
+            ),
+            lambda: render_ok(
+                lambda: load_genre_content(
+                    genre_id, available, after, limit, selected_fields, time_format
+                )
+            ),
+        )
+        if content_page is None:
+            response.status_code = HTTPStatus.NOT_FOUND.value
             return ReturnResponse.return_response(
-                status_code=HTTPStatus.OK.value, is_success=True, data=genres
+                status_code=HTTPStatus.NOT_FOUND.value,
+                is_success=False,
+                errors=["Genre not found"],
             )
+        return await cached_response(request, content_page)
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -35,12 +123,13 @@ class GenreBase(BaseModel):
 
 
 @genres_router.post("/")
-def create_genre(genre: GenreBase, response: Response):
+async def create_genre(genre: GenreBase, response: Response):
     try:
-        with Session(engine) as session:
+        async with async_session() as session:
             new_genre = Genre(name=genre.name)
             session.add(new_genre)
-            session.commit()
+            await session.commit()
+            invalidate_catalogue()
             response.status_code = HTTPStatus.CREATED.value
             return ReturnResponse.return_response(
                 status_code=HTTPStatus.CREATED.value,
@@ -50,7 +139,7 @@ def create_genre(genre: GenreBase, response: Response):
     except sqlalchemy.exc.IntegrityError as e:
         response.status_code = HTTPStatus.BAD_REQUEST.value
         return ReturnResponse.return_response(
-            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            status_code=HTTPStatus.BAD_REQUEST.value,
             is_success=False,
             errors=[f"{e.__class__.__name__}:Probably a duplicate genre"],
         )
@@ -64,13 +153,14 @@ def create_genre(genre: GenreBase, response: Response):
 
 
 @genres_router.put("/{genre_id}")
-def edit_genre(genre_id: int, genre: GenreBase, response: Response):
+async def edit_genre(genre_id: int, genre: GenreBase, response: Response):
     try:
-        with Session(engine) as session:
-            genre_to_update = session.get(Genre, genre_id)
+        async with async_session() as session:
+            genre_to_update = await session.get(Genre, genre_id)
             if genre_to_update:
                 genre_to_update.name = genre.name
-                session.commit()
+                await session.commit()
+                invalidate_catalogue()
                 response.status_code = HTTPStatus.OK.value
                 return ReturnResponse.return_response(
                     status_code=HTTPStatus.OK.value,
@@ -101,13 +191,14 @@ def edit_genre(genre_id: int, genre: GenreBase, response: Response):
 
 
 @genres_router.delete("/{genre_id}")
-def delete_genre(genre_id: int, response: Response):
+async def delete_genre(genre_id: int, response: Response):
     try:
-        with Session(engine) as session:
-            genre = session.get(Genre, genre_id)
+        async with async_session() as session:
+            genre = await session.get(Genre, genre_id)
             if genre:
-                session.delete(genre)
-                session.commit()
+                await session.delete(genre)
+                await session.commit()
+                invalidate_catalogue()
                 response.status_code = HTTPStatus.OK.value
                 return ReturnResponse.return_response(
                     status_code=HTTPStatus.OK.value,
@@ -0,0 +1,3 @@
+from apps.monitoring.router import monitoring_router, metrics_router
+
+__all__ = ["monitoring_router", "metrics_router"]
@@ -0,0 +1,205 @@
+import os
+import asyncio
+import logging
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+from models import engine, async_engine
+from models.pool import pool_stats
+from models.instrumentation import route_of
+from utils.cache import catalogue_cache
+from utils.log_utils import queue_handlers
+from auth.security import user_cache, token_cache, password_pool
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+# set by gunicorn_config, every worker then writes its samples to files in this
+# directory and a scrape of any worker returns the sum over all of them
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# how often a worker copies its pool and cache counters into the shared samples
+METRICS_REFRESH_INTERVAL = float(os.getenv("METRICS_REFRESH_INTERVAL", "15"))
+# when set, /metrics wants "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being handled",
+    multiprocess_mode="livesum",
+)
+SYNC_SOCKETS = Gauge(
+    "sync_websockets_open", "Open /sync/ws sockets", multiprocess_mode="livesum"
+)
+# messages per second is rate(sync_messages_total[1m])
+SYNC_MESSAGES = Counter("sync_messages_total", "Messages received on /sync/ws")
+POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Database pool connections by state",
+    ["engine", "state"],
+    multiprocess_mode="livesum",
+)
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Pool checkouts", ["engine"])
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Pool checkout timeouts", ["engine"])
+POOL_WAIT = Counter(
+    "db_pool_wait_seconds_total", "Seconds spent waiting for a connection", ["engine"]
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "In-process cache lookups", ["cache", "result"]
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "Password hashes and checks running or queued",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Password hashes and checks waiting for a hashing thread",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_MAX_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth_max",
+    "Deepest the password hashing queue has been",
+    multiprocess_mode="max",
+)
+LOG_RECORDS = Counter(
+    "log_records_total", "Records handed to the logging queue", ["result"]
+)
+
+
+class RuntimeMetrics:
+    """
+    the pool and cache counters live in plain attributes that are free to update,
+    they are copied into the prometheus samples before a scrape and, so the other
+    workers' values are current as well, every METRICS_REFRESH_INTERVAL seconds
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.engines = {"async": async_engine, "sync": engine}
+        self.caches = {
+            "catalogue": catalogue_cache.cache,
+            "user": user_cache.cache,
+            "token": token_cache,
+        }
+        self._seen: Dict[Tuple[str, str], float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _inc_to(self, counter, key: Tuple[str, str], total: float):
+        # the source counters only grow, export what was added since last time
+        delta = total - self._seen.get(key, 0)
+        if delta > 0:
+            counter.inc(delta)
+        self._seen[key] = total
+
+    def refresh(self):
+        for name, pool_engine in self.engines.items():
+            stats = pool_stats(pool_engine.pool)
+            if "checked_out" not in stats:
+                # sqlite's pools have no sizes or checkout metrics
+                continue
+            for state in ("checked_out", "checked_in", "overflow"):
+                POOL_CONNECTIONS.labels(name, state).set(stats[state])
+            if "checkouts" in stats:
+                self._inc_to(
+                    POOL_CHECKOUTS.labels(name), ("checkouts", name), stats["checkouts"]
+                )
+                self._inc_to(
+                    POOL_TIMEOUTS.labels(name), ("timeouts", name), stats["timeouts"]
+                )
+                self._inc_to(
+                    POOL_WAIT.labels(name), ("wait", name), stats["wait_seconds_total"]
+                )
+        for name, cache in self.caches.items():
+            self._inc_to(CACHE_LOOKUPS.labels(name, "hit"), (name, "hit"), cache.hits)
+            self._inc_to(
+                CACHE_LOOKUPS.labels(name, "miss"), (name, "miss"), cache.misses
+            )
+        password_stats = password_pool.stats()
+        PASSWORD_HASH_IN_FLIGHT.set(password_stats["in_flight"])
+        PASSWORD_HASH_QUEUE_DEPTH.set(password_stats["queue_depth"])
+        PASSWORD_HASH_MAX_QUEUE_DEPTH.set(password_stats["max_queue_depth"])
+        for result in ("enqueued", "dropped"):
+            total = sum(getattr(handler, result) for handler in queue_handlers)
+            self._inc_to(LOG_RECORDS.labels(result), ("log", result), total)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing metrics: {e.__class__.__name__}:{e}")
+
+    def start(self):
+        if self._task is None and PROMETHEUS_MULTIPROC_DIR:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+runtime_metrics = RuntimeMetrics(interval=METRICS_REFRESH_INTERVAL)
+
+
+def render_metrics() -> bytes:
+    runtime_metrics.refresh()
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    """
+    counts and times every http request by its route template, the route of a
+    request that matched no route is "unmatched" to keep the label set bounded
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            route = route_of(scope) if "endpoint" in scope else "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], route).observe(
+                perf_counter() - started
+            )
+            REQUESTS.labels(scope["method"], route, status).inc()
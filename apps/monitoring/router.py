@@ -0,0 +1,83 @@
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from auth import is_admin, FullUser
+from auth.security import password_pool
+from models import engine, async_engine
+from models.pool import pool_stats
+from utils.response import ReturnResponse
+from utils.tracing import (
+    ProfileFormat,
+    profile_collapsed,
+    profile_event_loop,
+    profile_lock,
+)
+from apps.monitoring.metrics import METRICS_TOKEN, render_metrics
+
+monitoring_router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+# scraped at the root, where prometheus looks by default
+metrics_router = APIRouter(tags=["monitoring"])
+
+
+@monitoring_router.get("/pool")
+async def get_pool_stats(
+    response: Response, current_user: Annotated[FullUser, Depends(is_admin)]
+):
+    response.status_code = HTTPStatus.OK.value
+    return ReturnResponse.return_response(
+        status_code=HTTPStatus.OK.value,
+        is_success=True,
+        data={
+            "async_engine": pool_stats(async_engine.pool),
+            "engine": pool_stats(engine.pool),
+            "password_hash": password_pool.stats(),
+        },
+    )
+
+
+@monitoring_router.get("/profile")
+async def get_profile(
+    response: Response,
+    current_user: Annotated[FullUser, Depends(is_admin)],
+    seconds: Annotated[float, Query(gt=0, le=60)] = 10,
+    profile_format: Annotated[ProfileFormat, Query(alias="format")] = "collapsed",
+):
+    """
+    profiles the worker that serves this request for `seconds`, collapsed stacks
+    of all its threads (flamegraph.pl, speedscope) or a cProfile table of its
+    event loop, the other workers of a gunicorn setup aren't profiled
+    """
+    if profile_lock.locked():
+        response.status_code = HTTPStatus.CONFLICT.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.CONFLICT.value,
+            is_success=False,
+            errors=["A profile of this worker is already running"],
+        )
+    try:
+        async with profile_lock:
+            if profile_format == "pstats":
+                profile = await profile_event_loop(seconds)
+            else:
+                profile = await profile_collapsed(seconds)
+        return PlainTextResponse(profile)
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+@metrics_router.get("/metrics")
+async def get_metrics(request: Request):
+    """prometheus text format, summed over all the workers under gunicorn"""
+    authorization = request.headers.get("authorization")
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        return Response(status_code=HTTPStatus.UNAUTHORIZED.value)
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
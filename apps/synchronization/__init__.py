@@ -1,3 +1,5 @@
 from apps.synchronization.router import sync_router
+from apps.synchronization.hub import sync_hub
+from apps.synchronization.buffer import position_buffer
 
-__all__ = ["sync_router"]
+__all__ = ["sync_router", "sync_hub", "position_buffer"]
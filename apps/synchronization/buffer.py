@@ -0,0 +1,174 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import async_session, Content, User, UserWatchingContent
+from models.upsert import upsert_statement
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+SYNC_FLUSH_INTERVAL = float(os.getenv("SYNC_FLUSH_INTERVAL", "5"))
+SYNC_BUFFER_MAX_PENDING = int(os.getenv("SYNC_BUFFER_MAX_PENDING", "10000"))
+# a position that fails this many flushes in a row is given up, connection errors
+# don't count so an outage doesn't lose the positions buffered meanwhile
+SYNC_FLUSH_MAX_RETRIES = int(os.getenv("SYNC_FLUSH_MAX_RETRIES", "5"))
+
+
+class PositionBuffer:
+    """
+    write-behind buffer for playback positions, keeps only the latest position per
+    (user_id, content_id) and writes everything pending in one batched upsert
+    every `interval` seconds, so db writes follow viewers instead of message rate
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        max_pending: int,
+        max_retries: int = SYNC_FLUSH_MAX_RETRIES,
+    ):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.pending: Dict[Tuple[int, int], int] = {}
+        self.failures: Dict[Tuple[int, int], int] = {}
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+        self._task: Optional[asyncio.Task] = None
+        # the flush put() starts when the buffer is full, at most one at a time
+        self._full_flush: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def put(self, user_id: int, content_id: int, timestamp: int):
+        self.pending[(user_id, content_id)] = timestamp
+        if len(self.pending) >= self.max_pending and (
+            self._full_flush is None or self._full_flush.done()
+        ):
+            self._full_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    def get(self, user_id: int, content_id: int) -> Optional[int]:
+        return self.pending.get((user_id, content_id))
+
+    async def flush(self, keys: Optional[Iterable[Tuple[int, int]]] = None):
+        async with self._flush_lock:
+            if keys is None:
+                batch, self.pending = self.pending, {}
+            else:
+                batch = {
+                    key: self.pending.pop(key) for key in keys if key in self.pending
+                }
+            if not batch:
+                return
+            try:
+                try:
+                    await self._write(batch)
+                except IntegrityError:
+                    # a position of a deleted user or content fails the whole batch
+                    batch = await self._without_deleted(batch)
+                    if batch:
+                        await self._write(batch)
+            except asyncio.CancelledError:
+                self._requeue(batch, failed=False)
+                raise
+            except OperationalError as e:
+                logger.error(f"Error flushing positions: {e.__class__.__name__}:{e}")
+                self._requeue(batch, failed=False)
+            except Exception as e:
+                logger.error(f"Error flushing positions: {e.__class__.__name__}:{e}")
+                self._requeue(batch, failed=True)
+            else:
+                for key in batch:
+                    self.failures.pop(key, None)
+
+    async def write_through(self, positions: Dict[Tuple[int, int], int]):
+        """
+        writes positions right away in one transaction, replacing whatever is still
+        pending for the same keys, errors are raised instead of retried
+        """
+        async with self._flush_lock:
+            for key in positions:
+                self.pending.pop(key, None)
+            await self._write(positions)
+
+    async def _write(self, batch: Dict[Tuple[int, int], int]):
+        rows = [
+            {"user_id": user_id, "content_id": content_id, "timestamp": timestamp}
+            for (user_id, content_id), timestamp in batch.items()
+        ]
+        async with async_session() as session:
+            # updated_at comes from the database clock, like the model default and
+            # the migration backfill, new rows get it from the column default
+            statement = upsert_statement(
+                session.bind.dialect.name,
+                UserWatchingContent.__table__,
+                ["timestamp"],
+                {"updated_at": func.now()},
+            )
+            await session.execute(statement, rows)
+            await session.commit()
+        self.flushed_rows += len(rows)
+
+    async def _without_deleted(self, batch: Dict[Tuple[int, int], int]):
+        """the batch less the positions whose user or content no longer exists"""
+        user_ids = {user_id for user_id, _ in batch}
+        content_ids = {content_id for _, content_id in batch}
+        async with async_session() as session:
+            users = set(
+                await session.scalars(select(User.id).filter(User.id.in_(user_ids)))
+            )
+            contents = set(
+                await session.scalars(
+                    select(Content.id).filter(Content.id.in_(content_ids))
+                )
+            )
+        kept = {
+            (user_id, content_id): timestamp
+            for (user_id, content_id), timestamp in batch.items()
+            if user_id in users and content_id in contents
+        }
+        dropped = len(batch) - len(kept)
+        if dropped:
+            self.dropped_rows += dropped
+            logger.warning(f"Dropped {dropped} positions of deleted users or content")
+        return kept
+
+    def _requeue(self, batch: Dict[Tuple[int, int], int], failed: bool):
+        # retry on the next flush unless a newer position arrived meanwhile
+        given_up = 0
+        for key, timestamp in batch.items():
+            if failed:
+                self.failures[key] = self.failures.get(key, 0) + 1
+                if self.failures[key] >= self.max_retries:
+                    del self.failures[key]
+                    given_up += 1
+                    continue
+            self.pending.setdefault(key, timestamp)
+        if given_up:
+            self.dropped_rows += given_up
+            logger.error(
+                f"Gave up on {given_up} positions after {self.max_retries} failures"
+            )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+position_buffer = PositionBuffer(
+    interval=SYNC_FLUSH_INTERVAL, max_pending=SYNC_BUFFER_MAX_PENDING
+)
@@ -0,0 +1,200 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from utils.time_format import TimeFormat, format_seconds
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed when SYNC_BROKER_URL points at redis
+    aioredis = None
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+# empty keeps fan-out inside this worker, redis://host:6379/0 fans out across workers
+SYNC_BROKER_URL = os.getenv("SYNC_BROKER_URL", "")
+SYNC_BROKER_CHANNEL = os.getenv("SYNC_BROKER_CHANNEL", "tv_backend:sync")
+# pushes queued per socket, a socket that can't keep up loses the oldest positions
+SYNC_SEND_QUEUE = int(os.getenv("SYNC_SEND_QUEUE", "16"))
+
+
+class Connection:
+    __slots__ = ("id", "user_id", "websocket", "push", "wire", "outbox", "sender")
+
+    def __init__(
+        self, user_id: int, websocket: WebSocket, push: bool, wire: TimeFormat
+    ):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.websocket = websocket
+        self.push = push
+        self.wire = wire
+        self.outbox: Optional[asyncio.Queue] = None
+        self.sender: Optional[asyncio.Task] = None
+
+    def start_sender(self):
+        self.outbox = asyncio.Queue(SYNC_SEND_QUEUE)
+        self.sender = asyncio.get_running_loop().create_task(self._send_queued())
+
+    def stop_sender(self):
+        if self.sender is not None:
+            self.sender.cancel()
+            self.sender = None
+
+    def send(self, payload: str) -> bool:
+        """
+        queues a push for this socket's own sender task, so a slow socket never
+        holds back the publisher, False when the oldest queued push was dropped
+        """
+        dropped = self.outbox.full()
+        if dropped:
+            self.outbox.get_nowait()
+        self.outbox.put_nowait(payload)
+        return not dropped
+
+    async def _send_queued(self):
+        while True:
+            payload = await self.outbox.get()
+            try:
+                await self.websocket.send_text(payload)
+            except Exception as e:
+                # the socket is closing, its handler unregisters the connection
+                logger.debug(f"Error in sync push: {e.__class__.__name__}:{e}")
+                return
+
+
+class InProcessBackend:
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    async def publish(self, message: dict):
+        # deliver only queues the pushes, the receivers' sender tasks write them
+        await self.deliver(message)
+
+    async def stop(self):
+        pass
+
+
+class RedisBackend:
+    def __init__(self, url: str, channel: str):
+        if aioredis is None:
+            raise RuntimeError("SYNC_BROKER_URL needs the redis package installed")
+        self.url = url
+        self.channel = channel
+        self.redis = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver):
+        self.redis = aioredis.from_url(self.url)
+        self._task = asyncio.get_running_loop().create_task(self._listen(deliver))
+
+    async def _listen(self, deliver):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in sync broker: {e.__class__.__name__}:{e}")
+                await asyncio.sleep(1)
+
+    async def publish(self, message: dict):
+        await self.redis.publish(self.channel, json.dumps(message))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+class SyncHub:
+    """
+    registry of the open sync sockets of every user, a position published by one socket
+    is pushed to the same user's other sockets that connected with push enabled
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.connections: Dict[int, Set[Connection]] = {}
+        self.pushed = 0
+        self.dropped = 0
+
+    def register(
+        self, user_id: int, websocket: WebSocket, push: bool, wire: TimeFormat = "hms"
+    ) -> Connection:
+        connection = Connection(user_id, websocket, push, wire)
+        if push:
+            connection.start_sender()
+        self.connections.setdefault(user_id, set()).add(connection)
+        return connection
+
+    def unregister(self, connection: Connection):
+        connection.stop_sender()
+        user_connections = self.connections.get(connection.user_id)
+        if user_connections is None:
+            return
+        user_connections.discard(connection)
+        if not user_connections:
+            del self.connections[connection.user_id]
+
+    async def publish(self, connection: Connection, content_id: int, timestamp: int):
+        try:
+            await self.backend.publish(
+                {
+                    "connection": connection.id,
+                    "user_id": connection.user_id,
+                    "content_id": content_id,
+                    "timestamp": timestamp,
+                }
+            )
+        except Exception as e:
+            # the position is buffered for the database already, only the push to
+            # the other devices is lost, so the sender's socket stays open
+            logger.error(f"Error in publishing position: {e.__class__.__name__}:{e}")
+
+    async def deliver(self, message: dict):
+        receivers = [
+            connection
+            for connection in self.connections.get(message["user_id"], ())
+            if connection.push and connection.id != message["connection"]
+        ]
+        if not receivers:
+            return
+        payloads = {
+            wire: json.dumps(
+                {
+                    "event": "position",
+                    "content_id": message["content_id"],
+                    "timestamp": format_seconds(message["timestamp"], wire),
+                }
+            )
+            for wire in {connection.wire for connection in receivers}
+        }
+        for connection in receivers:
+            if not connection.send(payloads[connection.wire]):
+                self.dropped += 1
+        self.pushed += len(receivers)
+
+    async def start(self):
+        await self.backend.start(self.deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+
+
+sync_hub = SyncHub(
+    RedisBackend(SYNC_BROKER_URL, SYNC_BROKER_CHANNEL)
+    if SYNC_BROKER_URL
+    else InProcessBackend()
+)
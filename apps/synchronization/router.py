@@ -1,23 +1,49 @@
 import json
+import asyncio
 import logging
-from typing import Annotated, Optional
+from http import HTTPStatus
+from typing import Annotated, Optional, List
 
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
 from pydantic import BaseModel, Field, ValidationError
-from fastapi import APIRouter, WebSocket, Depends, Request, HTTPException
+from fastapi import (
+    APIRouter,
+    WebSocket,
+    WebSocketDisconnect,
+    Depends,
+    Request,
+    Response,
+    HTTPException,
+)
 
 from auth import is_user, FullUser
-from models import User, Content, engine, Session, UserWatchingContent
+from utils.response import ReturnResponse
+from utils.pagination import MAX_BATCH_SIZE
+from utils.time_format import Seconds, TimeFormat, format_seconds
+from utils.cache import catalogue_cache
+from models import Content, async_session, UserWatchingContent
+from models.instrumentation import track_queries
+from apps.monitoring.metrics import SYNC_MESSAGES, SYNC_SOCKETS
+from apps.synchronization.hub import sync_hub
+from apps.synchronization.buffer import position_buffer
 
 sync_router = APIRouter(prefix="/sync")
 logger = logging.getLogger(f"TV_backend.{__name__}")
 templates = Jinja2Templates(directory="templates")
+# the route the queries of a sync message are logged under
+SYNC_ROUTE = "/sync/ws"
 
 
 class SyncData(BaseModel):
     content_id: int
-    timestamp: Annotated[Optional[str], Field(pattern="^(?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d$")] = None
+    # HH:MM:SS or seconds in both wire formats
+    timestamp: Optional[Seconds] = None
+
+
+class SyncBatch(BaseModel):
+    positions: Annotated[List[SyncData], Field(max_length=MAX_BATCH_SIZE)]
 
 
 @sync_router.get("/", response_class=HTMLResponse)
@@ -25,40 +51,122 @@ def sync_page(request: Request):
     return templates.TemplateResponse(name="watching.html", request=request)
 
 
+async def get_watching_position(user_id: int, content_id: int) -> Optional[int]:
+    timestamp = position_buffer.get(user_id, content_id)
+    if timestamp is not None:
+        return timestamp
+    async with async_session() as session:
+        return await session.scalar(
+            select(UserWatchingContent.timestamp).filter_by(
+                user_id=user_id, content_id=content_id
+            )
+        )
+
+
+@sync_router.post("/positions")
+async def sync_positions_batch(
+    batch: SyncBatch,
+    current_user: Annotated[FullUser, Depends(is_user)],
+    response: Response,
+):
+    """
+    replays the positions a device collected while offline in one transaction,
+    the last position of a content in the list wins
+    """
+    try:
+        content_ids = {position.content_id for position in batch.positions}
+        async with async_session() as session:
+            existing = set(
+                (
+                    await session.scalars(
+                        select(Content.id).filter(Content.id.in_(content_ids))
+                    )
+                ).all()
+            )
+        positions = {
+            (current_user.id, position.content_id): position.timestamp
+            for position in batch.positions
+            if position.content_id in existing and position.timestamp is not None
+        }
+        if positions:
+            await position_buffer.write_through(positions)
+        results = []
+        for position in batch.positions:
+            if position.content_id not in existing:
+                status = HTTPStatus.NOT_FOUND.value
+            elif position.timestamp is None:
+                status = HTTPStatus.BAD_REQUEST.value
+            else:
+                status = HTTPStatus.OK.value
+            results.append({"content_id": position.content_id, "status": status})
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value, is_success=True, data=results
+        )
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
 @sync_router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: str):
+async def websocket_endpoint(
+    websocket: WebSocket, token: str, push: bool = False, wire: TimeFormat = "hms"
+):
+    touched_keys = set()
+    connection = None
     try:
         await websocket.accept()
-        user = is_user(token=token)
+        user = await is_user(token=token)
         user_id = user.__dict__.get("id")
+        # with push=true the socket also receives the positions sent by the user's
+        # other devices, as json {"event": "position", "content_id", "timestamp"},
+        # wire=seconds replies with plain integer seconds instead of HH:MM:SS
+        connection = sync_hub.register(user_id, websocket, push, wire)
+        SYNC_SOCKETS.inc()
+        known_content = set()
+        known_version = catalogue_cache.version.current()
         while True:
             data = await websocket.receive_text()
-            sync_data = SyncData(**json.loads(data))
-            print(sync_data)
-            with Session(engine) as session:
-                user = session.get(User, user_id)
-                content = session.get(Content, sync_data.content_id)
-                if content is None:
-                    await websocket.send_text("Content not found")
-                    await websocket.close()
-                    break
-                user_content_watching_row = session.query(UserWatchingContent).filter_by(user_id=user.id,
-                                                                                         content_id=sync_data.content_id).first()
-                if user_content_watching_row:
-                    if sync_data.timestamp:
-                        user_content_watching_row.timestamp = sync_data.timestamp
-                        session.commit()
-                        await websocket.send_text(sync_data.timestamp)
-                    else:
-                        await websocket.send_text(user_content_watching_row.timestamp)
+            SYNC_MESSAGES.inc()
+            with track_queries(SYNC_ROUTE):
+                sync_data = SyncData(**json.loads(data))
+                logger.debug(f"Sync message from user {user_id}: {sync_data}")
+                # content deletes bump the catalogue version, check again after one
+                version = catalogue_cache.version.current()
+                if version != known_version:
+                    known_content.clear()
+                    known_version = version
+                if sync_data.content_id not in known_content:
+                    async with async_session() as session:
+                        content = await session.get(Content, sync_data.content_id)
+                    if content is None:
+                        await websocket.send_text("Content not found")
+                        await websocket.close()
+                        break
+                    known_content.add(sync_data.content_id)
+                touched_keys.add((user_id, sync_data.content_id))
+                if sync_data.timestamp is not None:
+                    position_buffer.put(
+                        user_id, sync_data.content_id, sync_data.timestamp
+                    )
+                    await websocket.send_text(
+                        str(format_seconds(sync_data.timestamp, wire))
+                    )
+                    await sync_hub.publish(
+                        connection, sync_data.content_id, sync_data.timestamp
+                    )
                     continue
-                else:
-                    user_watching_content = UserWatchingContent(user_id=user.id, content_id=content.id,
-                                                                timestamp="00:00:00")
-                    session.add(user_watching_content)
-                    session.commit()
-                    await websocket.send_text("00:00:00")
-                continue
+                timestamp = await get_watching_position(user_id, sync_data.content_id)
+                if timestamp is None:
+                    timestamp = 0
+                    position_buffer.put(user_id, sync_data.content_id, timestamp)
+                await websocket.send_text(str(format_seconds(timestamp, wire)))
+    except WebSocketDisconnect:
+        return
     except ValidationError as e:
         logger.error(f"Error in validating json: {e.__class__.__name__}:{e}")
         await websocket.close()
@@ -76,3 +184,11 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
         logger.error(f"Error in websocket: {e.__class__.__name__}:{e}")
         await websocket.close()
         return
+    finally:
+        if connection is not None:
+            sync_hub.unregister(connection)
+            SYNC_SOCKETS.dec()
+        # don't keep a disconnected viewer's position waiting for the next flush,
+        # shielded so the write survives the handler task being cancelled
+        if touched_keys:
+            await asyncio.shield(position_buffer.flush(touched_keys))
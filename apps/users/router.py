@@ -1,12 +1,12 @@
 from typing import Annotated, Optional
 
 import sqlalchemy
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from pydantic import BaseModel, Field, EmailStr
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import APIRouter, Depends, HTTPException, status, Response
 
-from models import User, engine
+from models import User, async_session
 from utils.response import ReturnResponse
 from auth import (
     UserPydanticModel,
@@ -15,25 +15,26 @@ from auth import (
     create_access_token,
     authenticate_user,
     get_password_hash,
+    invalidate_users,
 )
 
 users_router = APIRouter(prefix="/security", tags=["security"])
 
 
 @users_router.post("/register")
-def register_user(response: Response, user: UserPydanticModel):
+async def register_user(response: Response, user: UserPydanticModel):
     try:
-        with Session(engine) as session:
+        async with async_session() as session:
             new_user = User(
                 username=user.username,
                 email=user.email,
-                password=get_password_hash(user.password),
+                password=await get_password_hash(user.password),
                 name=user.name,
                 phone_number=user.phone_number,
                 type=user.type,
             )
             session.add(new_user)
-            session.commit()
+            await session.commit()
             return ReturnResponse.return_response(
                 status_code=status.HTTP_201_CREATED,
                 is_success=True,
@@ -66,7 +67,7 @@ class UserUpdate(BaseModel):
 
 
 @users_router.put("/update")
-def update_user(
+async def update_user(
     response: Response,
     user: UserUpdate,
     current_user: Annotated[FullUser, Depends(is_user)],
@@ -79,8 +80,8 @@ def update_user(
             errors=["You are not allowed to update this user"],
         )
     try:
-        with Session(engine) as session:
-            user_to_update = session.query(User).filter_by(id=user.id).first()
+        async with async_session() as session:
+            user_to_update = await session.scalar(select(User).filter_by(id=user.id))
             if not user_to_update:
                 response.status_code = status.HTTP_404_NOT_FOUND
                 return ReturnResponse.return_response(
@@ -89,7 +90,8 @@ def update_user(
                     errors=["User not found"],
                 )
             if (
-                not get_password_hash(user.old_password) == user_to_update.password
+                not await get_password_hash(user.old_password)
+                == user_to_update.password
                 or current_user.type != "admin"
             ):
                 response.status_code = status.HTTP_401_UNAUTHORIZED
@@ -103,8 +105,9 @@ def update_user(
             user_to_update.name = user.name
             user_to_update.phone_number = user.phone_number
             if user.new_password:
-                user_to_update.password = get_password_hash(user.new_password)
-            session.commit()
+                user_to_update.password = await get_password_hash(user.new_password)
+            await session.commit()
+            invalidate_users()
             return ReturnResponse.return_response(
                 status_code=status.HTTP_200_OK,
                 is_success=True,
@@ -128,7 +131,7 @@ class Token(BaseModel):
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,34 +1,209 @@
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Optional, List
 
-from pydantic import BaseModel
-from fastapi import APIRouter, Depends, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import Table, select, delete, func, or_
+from fastapi import APIRouter, Depends, Response, Query
 
 from auth import is_user, FullUser
 from utils.response import ReturnResponse
-from models import User, Content, engine, Session
+from models.upsert import insert_ignore_statement
+from utils.time_format import TimeFormat, format_seconds
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    MAX_BATCH_SIZE,
+    keyset_page,
+    split_page,
+)
+from models import (
+    Content,
+    UserWatchingContent,
+    async_session,
+    user_watched_content_association,
+    user_favorite_content_association,
+)
 
 actions_router = APIRouter(prefix="/actions", tags=["actions"])
 
+# a title watched past this share of its duration counts as finished
+FINISHED_RATIO = 0.95
+
 
 class ContentId(BaseModel):
     content_id: int
 
 
+class ContentIdBatch(BaseModel):
+    add: Annotated[List[int], Field(max_length=MAX_BATCH_SIZE)] = []
+    remove: Annotated[List[int], Field(max_length=MAX_BATCH_SIZE)] = []
+
+
+# the handlers below only touch the association tables through their
+# (user_id, content_id) primary key, so their cost doesn't grow with the history
+
+
+async def load_user_content_page(
+    association: Table, user_id: int, columns: list, after: Optional[int], limit: int
+):
+    async with async_session() as session:
+        # ordered by the association's own key so the (user_id, content_id)
+        # primary key serves both the filter and the order
+        query = (
+            select(association.c.content_id, *columns)
+            .join(Content, Content.id == association.c.content_id)
+            .filter(association.c.user_id == user_id)
+        )
+        rows = await session.execute(
+            keyset_page(query, association.c.content_id, after, limit)
+        )
+        return split_page(rows.all(), association.c.content_id, limit)
+
+
+async def count_user_content(association: Table, user_id: int) -> int:
+    async with async_session() as session:
+        return await session.scalar(
+            select(func.count())
+            .select_from(association)
+            .filter(association.c.user_id == user_id)
+        )
+
+
+async def add_user_content(association: Table, user_id: int, content_id: int) -> bool:
+    """returns False when the content doesn't exist, adding twice is a no-op"""
+    async with async_session() as session:
+        if await session.scalar(select(Content.id).filter_by(id=content_id)) is None:
+            return False
+        await session.execute(
+            insert_ignore_statement(session.bind.dialect.name, association),
+            [{"user_id": user_id, "content_id": content_id}],
+        )
+        await session.commit()
+        return True
+
+
+async def remove_user_content(
+    association: Table, user_id: int, content_id: int
+) -> bool:
+    """returns False when the content doesn't exist, removing twice is a no-op"""
+    async with async_session() as session:
+        result = await session.execute(
+            delete(association).where(
+                association.c.user_id == user_id,
+                association.c.content_id == content_id,
+            )
+        )
+        await session.commit()
+        if result.rowcount:
+            return True
+        return (
+            await session.scalar(select(Content.id).filter_by(id=content_id))
+            is not None
+        )
+
+
+async def apply_user_content_batch(
+    association: Table, user_id: int, add: List[int], remove: List[int]
+):
+    """
+    adds then removes in one transaction, returns a result per requested item,
+    unknown content gets a 404 and doesn't fail the rest of the batch
+    """
+    async with async_session() as session:
+        existing = set(
+            (
+                await session.scalars(
+                    select(Content.id).filter(Content.id.in_(set(add + remove)))
+                )
+            ).all()
+        )
+        to_add = [content_id for content_id in add if content_id in existing]
+        to_remove = [content_id for content_id in remove if content_id in existing]
+        if to_add:
+            await session.execute(
+                insert_ignore_statement(session.bind.dialect.name, association),
+                [
+                    {"user_id": user_id, "content_id": content_id}
+                    for content_id in dict.fromkeys(to_add)
+                ],
+            )
+        if to_remove:
+            await session.execute(
+                delete(association).where(
+                    association.c.user_id == user_id,
+                    association.c.content_id.in_(to_remove),
+                )
+            )
+        await session.commit()
+    return [
+        {
+            "content_id": content_id,
+            "action": action,
+            "status": (
+                HTTPStatus.OK.value
+                if content_id in existing
+                else HTTPStatus.NOT_FOUND.value
+            ),
+        }
+        for action, content_ids in (("add", add), ("remove", remove))
+        for content_id in content_ids
+    ]
+
+
 @actions_router.get("/watch")
-def get_user_watched(
+async def get_user_watched(
+    current_user: Annotated[FullUser, Depends(is_user)],
+    response: Response,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    after: Optional[int] = None,
+    time_format: TimeFormat = "hms",
+):
+    try:
+        rows, next_cursor = await load_user_content_page(
+            user_watched_content_association,
+            current_user.id,
+            [Content.title, Content.duration, Content.available],
+            after,
+            limit,
+        )
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value,
+            is_success=True,
+            data={
+                "content": [
+                    {
+                        "id": content_id,
+                        "title": title,
+                        "duration": format_seconds(duration, time_format),
+                        "available": available,
+                    }
+                    for content_id, title, duration, available in rows
+                ],
+                "next_cursor": next_cursor,
+            },
+        )
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+@actions_router.get("/watch/count")
+async def count_user_watched(
     current_user: Annotated[FullUser, Depends(is_user)], response: Response
 ):
     try:
-        with Session(engine) as session:
-            user = session.get(User, current_user.id)
-            watched_content = user.watched_content
-            response.status_code = HTTPStatus.OK.value
-            return ReturnResponse.return_response(
-                status_code=HTTPStatus.OK.value,
-                is_success=True,
-                data=[content for content in watched_content],
-            )
+        count = await count_user_content(
+            user_watched_content_association, current_user.id
+        )
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value, is_success=True, data={"count": count}
+        )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -39,29 +214,49 @@ def get_user_watched(
 
 
 @actions_router.post("/watch")
-def user_watch_content(
+async def user_watch_content(
     current_user: Annotated[FullUser, Depends(is_user)],
     content: ContentId,
     response: Response,
 ):
     try:
-        with Session(engine) as session:
-            user = session.get(User, current_user.id)
-            content = session.query(Content).filter_by(id=content.content_id).first()
-            if not content:
-                response.status_code = HTTPStatus.NOT_FOUND.value
-                return ReturnResponse.return_response(
-                    status_code=HTTPStatus.NOT_FOUND.value,
-                    is_success=False,
-                    errors=["Content not found"],
-                )
-            user.watched_content.append(content)
-            session.commit()
+        if not await add_user_content(
+            user_watched_content_association, current_user.id, content.content_id
+        ):
+            response.status_code = HTTPStatus.NOT_FOUND.value
             return ReturnResponse.return_response(
-                status_code=HTTPStatus.OK.value,
-                is_success=True,
-                data={"user_id": user.id, "content_id": content.id},
+                status_code=HTTPStatus.NOT_FOUND.value,
+                is_success=False,
+                errors=["Content not found"],
             )
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value,
+            is_success=True,
+            data={"user_id": current_user.id, "content_id": content.content_id},
+        )
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+@actions_router.post("/watch/batch")
+async def user_watch_content_batch(
+    current_user: Annotated[FullUser, Depends(is_user)],
+    batch: ContentIdBatch,
+    response: Response,
+):
+    try:
+        results = await apply_user_content_batch(
+            user_watched_content_association, current_user.id, batch.add, batch.remove
+        )
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value, is_success=True, data=results
+        )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -72,29 +267,26 @@ def user_watch_content(
 
 
 @actions_router.delete("/watch/{content_id}")
-def remove_user_watched_content(
+async def remove_user_watched_content(
     current_user: Annotated[FullUser, Depends(is_user)],
     content_id: int,
     response: Response,
 ):
     try:
-        with Session(engine) as session:
-            user = session.get(User, current_user.id)
-            content = session.query(Content).filter_by(id=content_id).first()
-            if not content:
-                response.status_code = HTTPStatus.NOT_FOUND.value
-                return ReturnResponse.return_response(
-                    status_code=HTTPStatus.NOT_FOUND.value,
-                    is_success=False,
-                    errors=["Content not found"],
-                )
-            user.watched_content.remove(content)
-            session.commit()
+        if not await remove_user_content(
+            user_watched_content_association, current_user.id, content_id
+        ):
+            response.status_code = HTTPStatus.NOT_FOUND.value
             return ReturnResponse.return_response(
-                status_code=HTTPStatus.OK.value,
-                is_success=True,
-                data={"Message": "unwatched successfully"},
+                status_code=HTTPStatus.NOT_FOUND.value,
+                is_success=False,
+                errors=["Content not found"],
             )
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value,
+            is_success=True,
+            data={"Message": "unwatched successfully"},
+        )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -105,19 +297,50 @@ def remove_user_watched_content(
 
 
 @actions_router.get("/favourites")
-def get_user_favourites(
+async def get_user_favourites(
+    current_user: Annotated[FullUser, Depends(is_user)],
+    response: Response,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    after: Optional[int] = None,
+):
+    try:
+        rows, next_cursor = await load_user_content_page(
+            user_favorite_content_association,
+            current_user.id,
+            [],
+            after,
+            limit,
+        )
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value,
+            is_success=True,
+            data={
+                "content": [content_id for (content_id,) in rows],
+                "next_cursor": next_cursor,
+            },
+        )
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+@actions_router.get("/favourites/count")
+async def count_user_favourites(
     current_user: Annotated[FullUser, Depends(is_user)], response: Response
 ):
     try:
-        with Session(engine) as session:
-            user = session.get(User, current_user.id)
-            favourite_content = user.favourite_content
-            response.status_code = HTTPStatus.OK.value
-            return ReturnResponse.return_response(
-                status_code=HTTPStatus.OK.value,
-                is_success=True,
-                data=[content.id for content in favourite_content],
-            )
+        count = await count_user_content(
+            user_favorite_content_association, current_user.id
+        )
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value, is_success=True, data={"count": count}
+        )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -128,29 +351,49 @@ def get_user_favourites(
 
 
 @actions_router.post("/favourites")
-def user_favourite_content(
+async def user_favourite_content(
     current_user: Annotated[FullUser, Depends(is_user)],
     content: ContentId,
     response: Response,
 ):
     try:
-        with Session(engine) as session:
-            user = session.get(User, current_user.id)
-            content = session.query(Content).filter_by(id=content.content_id).first()
-            if not content:
-                response.status_code = HTTPStatus.NOT_FOUND.value
-                return ReturnResponse.return_response(
-                    status_code=HTTPStatus.NOT_FOUND.value,
-                    is_success=False,
-                    errors=["Content not found"],
-                )
-            user.favourite_content.append(content)
-            session.commit()
+        if not await add_user_content(
+            user_favorite_content_association, current_user.id, content.content_id
+        ):
+            response.status_code = HTTPStatus.NOT_FOUND.value
             return ReturnResponse.return_response(
-                status_code=HTTPStatus.OK.value,
-                is_success=True,
-                data={"user_id": user.id, "content_id": content.id},
+                status_code=HTTPStatus.NOT_FOUND.value,
+                is_success=False,
+                errors=["Content not found"],
             )
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value,
+            is_success=True,
+            data={"user_id": current_user.id, "content_id": content.content_id},
+        )
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+@actions_router.post("/favourites/batch")
+async def user_favourite_content_batch(
+    current_user: Annotated[FullUser, Depends(is_user)],
+    batch: ContentIdBatch,
+    response: Response,
+):
+    try:
+        results = await apply_user_content_batch(
+            user_favorite_content_association, current_user.id, batch.add, batch.remove
+        )
+        response.status_code = HTTPStatus.OK.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value, is_success=True, data=results
+        )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
         return ReturnResponse.return_response(
@@ -161,28 +404,80 @@ def user_favourite_content(
 
 
 @actions_router.delete("/favourites/{content_id}")
-def remove_user_favourites_content(
+async def remove_user_favourites_content(
     current_user: Annotated[FullUser, Depends(is_user)],
     content_id: int,
     response: Response,
 ):
     try:
-        with Session(engine) as session:
-            user = session.get(User, current_user.id)
-            content = session.query(Content).filter_by(id=content_id).first()
-            if not content:
-                response.status_code = HTTPStatus.NOT_FOUND.value
-                return ReturnResponse.return_response(
-                    status_code=HTTPStatus.NOT_FOUND.value,
-                    is_success=False,
-                    errors=["Content not found"],
+        if not await remove_user_content(
+            user_favorite_content_association, current_user.id, content_id
+        ):
+            response.status_code = HTTPStatus.NOT_FOUND.value
+            return ReturnResponse.return_response(
+                status_code=HTTPStatus.NOT_FOUND.value,
+                is_success=False,
+                errors=["Content not found"],
+            )
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.OK.value,
+            is_success=True,
+            data={"Message": "unfavoured successfully"},
+        )
+    except Exception as e:
+        response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        return ReturnResponse.return_response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            is_success=False,
+            errors=[f"{e.__class__.__name__}:{str(e)}"],
+        )
+
+
+@actions_router.get("/continue-watching")
+async def get_continue_watching(
+    current_user: Annotated[FullUser, Depends(is_user)],
+    response: Response,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    time_format: TimeFormat = "hms",
+):
+    try:
+        async with async_session() as session:
+            # walks ix_user_watching_content_recent backwards, newest first
+            rows = await session.execute(
+                select(
+                    Content.id,
+                    Content.title,
+                    Content.duration,
+                    UserWatchingContent.timestamp,
+                    UserWatchingContent.updated_at,
+                )
+                .join(Content, Content.id == UserWatchingContent.content_id)
+                .where(
+                    UserWatchingContent.user_id == current_user.id,
+                    UserWatchingContent.timestamp > 0,
+                    or_(
+                        Content.duration.is_(None),
+                        UserWatchingContent.timestamp
+                        < Content.duration * FINISHED_RATIO,
+                    ),
                 )
-            user.favourite_content.remove(content)
-            session.commit()
+                .order_by(UserWatchingContent.updated_at.desc())
+                .limit(limit)
+            )
+            response.status_code = HTTPStatus.OK.value
             return ReturnResponse.return_response(
                 status_code=HTTPStatus.OK.value,
                 is_success=True,
-                data={"Message": "unfavoured successfully"},
+                data=[
+                    {
+                        "content_id": content_id,
+                        "title": title,
+                        "position": format_seconds(position, time_format),
+                        "duration": format_seconds(duration, time_format),
+                        "updated_at": updated_at,
+                    }
+                    for content_id, title, duration, position, updated_at in rows
+                ],
             )
     except Exception as e:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
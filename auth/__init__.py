@@ -6,6 +6,7 @@ from auth.security import (
     get_password_hash,
     authenticate_user,
     create_access_token,
+    invalidate_users,
 )
 
 __all__ = [
@@ -16,4 +17,5 @@ __all__ = [
     "get_password_hash",
     "authenticate_user",
     "create_access_token",
+    "invalidate_users",
 ]
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+
+class PasswordHashPool:
+    """
+    runs bcrypt on a small dedicated thread pool (bcrypt releases the GIL), so a login
+    storm neither blocks the event loop nor takes over starlette's threadpool,
+    requests above `max_workers` wait in the pool queue
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int, queue_warning: int = 0):
+        self.context = context
+        self.max_workers = max_workers
+        self.queue_warning = queue_warning
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.max_workers, 0)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    def _done(self, _future: Future):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            self.in_flight += 1
+            queue_depth = self.queue_depth
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        if self.queue_warning and queue_depth >= self.queue_warning:
+            logger.warning(f"Password hashing queue depth is {queue_depth}")
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(
+            self._submit(self.context.verify, plain_password, hashed_password)
+        )
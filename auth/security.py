@@ -1,4 +1,5 @@
 import os
+import time
 import logging
 from typing import Annotated
 from datetime import datetime, timedelta
@@ -6,78 +7,137 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from jose import jwt, JWTError
 from pydantic import BaseModel, Field, EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
 
-from models import User, engine
+from models import User, async_session
+from utils.cache import TTLCache, VersionFile, VersionedCache, default_version_file
+from utils.tracing import span
+from auth.password_pool import PasswordHashPool
 
 load_dotenv()
 logger = logging.getLogger(f"TV_backend.{__name__}")
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 15
+
+# users are re-read from the database at most every USER_CACHE_TTL seconds, changes
+# made through the api bump USER_VERSION_FILE and every worker drops its cached users
+USER_VERSION_FILE = os.getenv("USER_VERSION_FILE") or default_version_file("user")
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# bcrypt is cpu bound, more hashing threads than cores only adds latency
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_WARNING = int(os.getenv("PASSWORD_HASH_QUEUE_WARNING", "100"))
+
+user_cache = VersionedCache(
+    VersionFile(USER_VERSION_FILE), maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL
+)
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/security/token")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_pool = PasswordHashPool(
+    pwd_context,
+    max_workers=PASSWORD_HASH_WORKERS,
+    queue_warning=PASSWORD_HASH_QUEUE_WARNING,
+)
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_pool.verify_async(plain_password, hashed_password)
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_pool.hash_async(password)
 
 
-def get_user(username: str):
+async def get_user(username: str):
     try:
-        with Session(engine) as session:
-            user = session.query(User).filter_by(username=username).first()
+        async with async_session() as session:
+            user = await session.scalar(select(User).filter_by(username=username))
             return user
     except Exception as e:
         logger.error(f"Error while getting user: {e.__class__.__name__}:{e}")
         return None
 
 
-def authenticate_user(username: str, password: str):
-    user = get_user(username)
+async def get_cached_user(username: str):
+    # None is also a failed query, so it isn't cached
+    return await user_cache.get_or_load_async(
+        username, lambda: get_user(username), cache_none=False
+    )
+
+
+def invalidate_users():
+    """
+    after a user change, every worker drops its cached users, not only the changed
+    ones, so a demoted admin loses admin rights on all of them with the next request
+    """
+    try:
+        user_cache.invalidate()
+    except OSError as e:
+        user_cache.cache.clear()
+        logger.error(f"Error bumping user version: {e.__class__.__name__}:{e}")
+
+
+def decode_token_subject(token: str):
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is None:
+        return None
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        # never serve a token from the cache past its own expiry
+        token_cache.set(token, username, ttl=min(expires_in, token_cache.ttl))
+    return username
+
+
+async def authenticate_user(username: str, password: str):
+    user = await get_user(username)
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not await verify_password(password, user.password):
         return False
     return user
 
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=15)
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def is_user(token: Annotated[str, Depends(oauth2_scheme)]):
+async def is_user(token: Annotated[str, Depends(oauth2_scheme)]):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        with span("jwt.decode"):
+            username = decode_token_subject(token)
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user(username)
+    with span("get_user"):
+        user = await get_cached_user(username)
     if user is None:
         raise credentials_exception
     return user
 
 
-def is_admin(current_user: Annotated[User, Depends(is_user)]):
+async def is_admin(current_user: Annotated[User, Depends(is_user)]):
     if current_user.type != "admin":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,177 @@
+"""
+Seeds a throwaway database with a catalogue, users and their watch history.
+
+Every user is called `bench<n>` and shares `--password`, so load generators can log
+in as any of them. The data is generated from `--seed`, the same arguments always
+build the same database and runs against it can be compared across commits.
+
+    python -m benchmarks.seed --database /tmp/bench.db --users 1000 --contents 50000
+"""
+
+import os
+import json
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+BENCH_PASSWORD = "benchpass"
+INSERT_CHUNK_SIZE = 5000
+TITLE_WORDS = (
+    "night city river last secret garden winter storm road house star ocean king "
+    "shadow summer island fire dream"
+).split()
+
+
+def username(user_number: int) -> str:
+    return f"bench{user_number}"
+
+
+def insert_chunked(connection, table, rows):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        connection.execute(table.insert(), rows[start : start + INSERT_CHUNK_SIZE])
+
+
+def seed(args) -> dict:
+    """builds the schema and data described by args, returns the scale"""
+    # models builds its engines from the environment at import time
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{args.database}")
+    from sqlalchemy import create_engine
+    from passlib.context import CryptContext
+
+    from models.user_content_device_models import (
+        Base,
+        User,
+        Genre,
+        Content,
+        UserWatchingContent,
+        content_genre_association,
+        user_watched_content_association,
+        user_favorite_content_association,
+    )
+
+    rng = random.Random(args.seed)
+    engine = create_engine(f"sqlite:///{args.database}")
+    Base.metadata.create_all(engine)
+    # hashing is slow on purpose, every user gets the same hash
+    password = CryptContext(schemes=["bcrypt"]).hash(args.password)
+    now = datetime.utcnow()
+    content_ids = range(1, args.contents + 1)
+    genre_ids = range(1, args.genres + 1)
+    history = min(args.history, args.contents)
+    with engine.begin() as connection:
+        insert_chunked(
+            connection,
+            Genre.__table__,
+            [{"id": genre_id, "name": f"genre {genre_id}"} for genre_id in genre_ids],
+        )
+        insert_chunked(
+            connection,
+            Content.__table__,
+            [
+                {
+                    "id": content_id,
+                    "title": " ".join(rng.sample(TITLE_WORDS, 3)) + f" {content_id}",
+                    "duration": rng.randrange(1200, 10800),
+                    "available": rng.random() < 0.8,
+                }
+                for content_id in content_ids
+            ],
+        )
+        insert_chunked(
+            connection,
+            content_genre_association,
+            [
+                {"genre_id": genre_id, "content_id": content_id}
+                for content_id in content_ids
+                for genre_id in rng.sample(genre_ids, min(2, args.genres))
+            ],
+        )
+        insert_chunked(
+            connection,
+            User.__table__,
+            [
+                {
+                    "id": user_number,
+                    "username": username(user_number),
+                    "email": f"{username(user_number)}@example.com",
+                    "password": password,
+                    "name": username(user_number),
+                    "phone_number": "00000000000",
+                    "type": "user",
+                }
+                for user_number in range(1, args.users + 1)
+            ],
+        )
+        for user_number in range(1, args.users + 1):
+            watched = rng.sample(content_ids, history)
+            insert_chunked(
+                connection,
+                user_watched_content_association,
+                [
+                    {"user_id": user_number, "content_id": content_id}
+                    for content_id in watched
+                ],
+            )
+            insert_chunked(
+                connection,
+                user_favorite_content_association,
+                [
+                    {"user_id": user_number, "content_id": content_id}
+                    for content_id in watched[: history // 10]
+                ],
+            )
+            insert_chunked(
+                connection,
+                UserWatchingContent.__table__,
+                [
+                    {
+                        "user_id": user_number,
+                        "content_id": content_id,
+                        "timestamp": rng.randrange(60, 1200),
+                        "updated_at": now - timedelta(minutes=minutes),
+                    }
+                    for minutes, content_id in enumerate(watched[: history // 5])
+                ],
+            )
+    engine.dispose()
+    return {
+        "users": args.users,
+        "contents": args.contents,
+        "genres": args.genres,
+        "history": history,
+        "seed": args.seed,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--contents", type=int, default=10000)
+    parser.add_argument("--genres", type=int, default=20)
+    parser.add_argument(
+        "--history", type=int, default=200, help="watched contents per user"
+    )
+    parser.add_argument("--password", default=BENCH_PASSWORD)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+    parser.add_argument(
+        "--database",
+        default=os.path.join(tempfile.mkdtemp(), "bench.db"),
+        help="sqlite file to build, must not exist yet",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = seed(args)
+    print(json.dumps({"database": args.database, **result}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+"""
+How much faster is the orjson envelope than the old jsonable_encoder path?
+
+Encodes a generated catalogue of `--rows` content rows both ways and reports the
+per encode timings as json. The old path ran jsonable_encoder in ReturnResponse,
+again in fastapi's response serialization and then json.dumps, the new one hands
+the envelope straight to orjson. The orm case encodes unsaved Content objects, the
+old way through jsonable_encoder's introspection, the new way through a mapper.
+
+    python -m benchmarks.serialization --rows 10000
+"""
+
+import json
+import time
+import argparse
+import statistics
+
+
+def build_rows(count: int):
+    genres = [{"id": genre_id, "name": f"genre {genre_id}"} for genre_id in range(10)]
+    return [
+        {
+            "id": content_id,
+            "title": f"content title {content_id}",
+            "duration": f"{content_id % 3:02d}:{content_id % 60:02d}:00",
+            "available": content_id % 2 == 0,
+            "genres": genres[content_id % 10 : content_id % 10 + 2],
+        }
+        for content_id in range(1, count + 1)
+    ]
+
+
+def timed(function, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function()
+        timings.append(time.perf_counter() - started)
+    return body, {
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+    }
+
+
+def compare(old, new, repeat: int):
+    old_body, old_timing = timed(old, repeat)
+    new_body, new_timing = timed(new, repeat)
+    if json.loads(old_body) != json.loads(new_body):
+        raise RuntimeError("the encoders disagree")
+    return {
+        "old": old_timing,
+        "new": new_timing,
+        "speedup": round(old_timing["mean_ms"] / new_timing["mean_ms"], 2),
+        "bytes": len(new_body),
+    }
+
+
+def run(args):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from models import Content
+    from utils.response import ReturnResponse, object_mapper
+
+    def old_envelope(data):
+        envelope = jsonable_encoder(
+            {"statusCode": 200, "data": data, "is_success": True}
+        )
+        return JSONResponse(jsonable_encoder(envelope)).body
+
+    def new_envelope(data):
+        return ReturnResponse.return_response(
+            status_code=200, is_success=True, data=data
+        ).body
+
+    rows = build_rows(args.rows)
+    content = [
+        Content(
+            id=row["id"],
+            title=row["title"],
+            duration=row["id"],
+            available=row["available"],
+        )
+        for row in rows
+    ]
+    content_to_dict = object_mapper("id", "title", "duration", "available")
+    return {
+        "rows": args.rows,
+        "repeat": args.repeat,
+        "catalogue_rows": compare(
+            lambda: old_envelope(rows), lambda: new_envelope(rows), args.repeat
+        ),
+        "orm_objects": compare(
+            lambda: old_envelope(content),
+            lambda: new_envelope([content_to_dict(item) for item in content]),
+            args.repeat,
+        ),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(json.dumps(run(args), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,290 @@
+"""
+End to end load test of the http api and the /sync/ws sockets on seeded data.
+
+Seeds a throwaway sqlite database (see benchmarks.seed for the scale options), starts
+a uvicorn worker on it and drives every scenario with `--concurrency` clients, each
+logged in as a different seeded user. Then `--ws-clients` sockets stream positions
+for `--ws-duration` seconds. Throughput, p50/p95/p99 latency and database queries per
+request (from the `Server-Timing: db` entry) are printed as json and written to
+`--output`, so runs of two commits can be diffed. With `--url` an already running
+server seeded with the same arguments is used instead.
+
+    python -m benchmarks.suite --users 200 --contents 20000 --output before.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+from benchmarks import seed
+from benchmarks.sync_ws import percentile, run_client
+
+# a scenario picks the (method, path, json body) of its next request
+Scenario = Callable[[random.Random], Tuple[str, str, object]]
+
+
+def build_scenarios(contents: int, genres: int) -> Dict[str, Scenario]:
+    return {
+        "catalogue": lambda rng: ("GET", "/content/?limit=100", None),
+        "catalogue_available": lambda rng: (
+            "GET",
+            "/content/?limit=100&only_available=true",
+            None,
+        ),
+        "content": lambda rng: ("GET", f"/content/{rng.randint(1, contents)}", None),
+        "genre_content": lambda rng: (
+            "GET",
+            f"/genres/{rng.randint(1, genres)}/content?limit=50",
+            None,
+        ),
+        "search": lambda rng: (
+            "GET",
+            f"/content/search?q={rng.choice(seed.TITLE_WORDS)[:3]}",
+            None,
+        ),
+        "watch_history": lambda rng: ("GET", "/actions/watch?limit=100", None),
+        "continue_watching": lambda rng: ("GET", "/actions/continue-watching", None),
+        "add_watched": lambda rng: (
+            "POST",
+            "/actions/watch",
+            {"content_id": rng.randint(1, contents)},
+        ),
+        "sync_positions": lambda rng: (
+            "POST",
+            "/sync/positions",
+            {
+                "positions": [
+                    {"content_id": rng.randint(1, contents), "timestamp": position}
+                    for position in range(60, 660, 60)
+                ]
+            },
+        ),
+    }
+
+
+def query_count(server_timing: str) -> Optional[int]:
+    """the count of the `db;dur=..;desc="<count> queries"` entry"""
+    for entry in server_timing.split(","):
+        name, _, params = entry.strip().partition(";")
+        if name == "db" and 'desc="' in params:
+            return int(params.split('desc="')[1].split()[0])
+    return None
+
+
+def summarize(latencies, elapsed: float) -> dict:
+    return {
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies, default=0) * 1000, 3),
+        },
+    }
+
+
+async def run_scenario(client, tokens, scenario: Scenario, requests: int, seed_: int):
+    latencies, queries, errors = [], [], []
+    remaining = iter(range(requests))
+
+    async def worker(number: int):
+        rng = random.Random(seed_ * 1000 + number)
+        headers = {"Authorization": f"Bearer {tokens[number]}"}
+        for _ in remaining:
+            method, path, body = scenario(rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(
+                    method, path, json=body, headers=headers
+                )
+            except httpx.HTTPError as e:
+                errors.append(f"{e.__class__.__name__}:{e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors.append(f"{method} {path}: {response.status_code}")
+            count = query_count(response.headers.get("server-timing", ""))
+            if count is not None:
+                queries.append(count)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(len(tokens))))
+    result = summarize(latencies, time.perf_counter() - started)
+    result.update(
+        {
+            "requests": len(latencies),
+            "errors": len(errors),
+            "error_samples": errors[:5],
+            "queries_per_request": {
+                "mean": round(statistics.fmean(queries), 2),
+                "max": max(queries),
+            }
+            if queries
+            else None,
+        }
+    )
+    return result
+
+
+async def run_sockets(url: str, tokens, args) -> dict:
+    ws_base = url.replace("http://", "ws://").replace("https://", "wss://")
+    latencies, errors = [], []
+    started = time.monotonic()
+    deadline = started + args.ws_ramp + args.ws_duration
+    clients = []
+    for number in range(args.ws_clients):
+        clients.append(
+            asyncio.create_task(
+                run_client(
+                    f"{ws_base}/sync/ws?token={tokens[number % len(tokens)]}",
+                    number % args.contents + 1,
+                    args.ws_interval,
+                    deadline,
+                    latencies,
+                    errors,
+                )
+            )
+        )
+        if args.ws_ramp:
+            await asyncio.sleep(args.ws_ramp / args.ws_clients)
+    await asyncio.gather(*clients)
+    result = summarize(latencies, time.monotonic() - started)
+    result.update(
+        {
+            "clients": args.ws_clients,
+            "messages": len(latencies),
+            "errors": len(errors),
+            "error_samples": errors[:5],
+        }
+    )
+    return result
+
+
+async def login(client, users: int, password: str):
+    tokens = []
+    for user_number in range(1, users + 1):
+        response = await client.post(
+            "/security/token",
+            data={"username": seed.username(user_number), "password": password},
+        )
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def run(args, url: str) -> dict:
+    scenarios = build_scenarios(args.contents, args.genres)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        tokens = await login(client, min(args.concurrency, args.users), args.password)
+        # one pass over every scenario so the catalogue caches and the title index
+        # are built before anything is timed
+        for name in selected:
+            await run_scenario(client, tokens, scenarios[name], len(tokens), args.seed)
+        http = {
+            name: await run_scenario(
+                client, tokens, scenarios[name], args.requests, args.seed
+            )
+            for name in selected
+        }
+    websocket = await run_sockets(url, tokens, args) if args.ws_clients else None
+    return {"http": http, "websocket": websocket}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_until_up(url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"benchmark server exited with {server.returncode}")
+        try:
+            httpx.get(f"{url}/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"benchmark server didn't answer on {url}")
+
+
+def start_server(args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{args.database}"
+    env.pop("ASYNC_DATABASE_URL", None)
+    env.setdefault("SECRET_KEY", "benchmark")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port)]
+        + ["--log-level", "warning"],
+        env=env,
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    seed.add_arguments(parser)
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument("--port", type=int, default=8077)
+    parser.add_argument(
+        "--database",
+        default=os.path.join(tempfile.mkdtemp(), "bench.db"),
+        help="sqlite file to build, must not exist yet",
+    )
+    parser.add_argument("--scenarios", help="comma separated, all by default")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--ws-clients", type=int, default=200)
+    parser.add_argument("--ws-interval", type=float, default=1.0)
+    parser.add_argument("--ws-duration", type=float, default=10.0)
+    parser.add_argument("--ws-ramp", type=float, default=2.0)
+    parser.add_argument("--output", help="also write the json report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = {"commit": git_commit(), "scale": None}
+    server = None
+    url = args.url
+    if url is None:
+        report["scale"] = seed.seed(args)
+        url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args)
+    try:
+        if server is not None:
+            wait_until_up(url, server)
+        report.update(asyncio.run(run(args, url)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    errors = sum(result["errors"] for result in report["http"].values())
+    if report["websocket"]:
+        errors += report["websocket"]["errors"]
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""
+How many concurrent /sync/ws sockets can one worker hold?
+
+Opens `--clients` websockets against a running server, every client sends a position
+update every `--interval` seconds and waits for the echo, and the round trip latencies
+are reported as json. Exits with status 1 when p99 is above `--target-p99-ms`.
+
+    uvicorn main:app --port 8000 --workers 1
+    python -m benchmarks.sync_ws --username bench --password benchpass --clients 2000
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import urllib.parse
+import urllib.request
+
+import websockets
+
+
+def get_token(base_url: str, username: str, password: str) -> str:
+    body = urllib.parse.urlencode({"username": username, "password": password})
+    request = urllib.request.Request(
+        f"{base_url}/security/token", data=body.encode(), method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())["access_token"]
+
+
+def percentile(samples, percent: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    index = min(int(round(percent / 100 * (len(samples) - 1))), len(samples) - 1)
+    return samples[index]
+
+
+def seconds_to_hms(seconds: int) -> str:
+    return f"{seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+async def run_client(ws_url, content_id, interval, deadline, latencies, errors):
+    try:
+        async with websockets.connect(ws_url, open_timeout=30) as websocket:
+            await websocket.send(json.dumps({"content_id": content_id}))
+            await websocket.recv()
+            position = 0
+            # spread the clients over the interval like real boxes
+            await asyncio.sleep(random.uniform(0, interval))
+            while time.monotonic() < deadline:
+                position += int(interval) or 1
+                started = time.perf_counter()
+                await websocket.send(
+                    json.dumps(
+                        {
+                            "content_id": content_id,
+                            "timestamp": seconds_to_hms(position),
+                        }
+                    )
+                )
+                await websocket.recv()
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(interval)
+    except Exception as e:
+        errors.append(f"{e.__class__.__name__}:{e}")
+
+
+async def run(args, token: str):
+    ws_base = args.url.replace("http://", "ws://").replace("https://", "wss://")
+    ws_url = f"{ws_base}/sync/ws?token={token}"
+    latencies, errors = [], []
+    started = time.monotonic()
+    deadline = started + args.ramp + args.duration
+    clients = []
+    for _ in range(args.clients):
+        clients.append(
+            asyncio.create_task(
+                run_client(
+                    ws_url, args.content_id, args.interval, deadline, latencies, errors
+                )
+            )
+        )
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.clients)
+    await asyncio.gather(*clients)
+    elapsed = time.monotonic() - started
+    return {
+        "clients": args.clients,
+        "interval_seconds": args.interval,
+        "duration_seconds": round(elapsed, 3),
+        "messages": len(latencies),
+        "messages_per_second": round(len(latencies) / elapsed, 2),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies, default=0) * 1000, 3),
+        },
+        "target_p99_ms": args.target_p99_ms,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", help="bearer token, or use --username/--password")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument(
+        "--ramp", type=float, default=5.0, help="seconds to open all sockets"
+    )
+    parser.add_argument("--content-id", type=int, default=1)
+    parser.add_argument("--target-p99-ms", type=float, default=50.0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    token = args.token or get_token(args.url, args.username, args.password)
+    result = asyncio.run(run(args, token))
+    print(json.dumps(result, indent=2))
+    return 0 if result["latency_ms"]["p99"] <= args.target_p99_ms else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,187 @@
+"""
+Does the cost of the /actions watched and favourites endpoints grow with the history?
+
+Builds a throwaway sqlite database, gives one user a watched and favourites history
+of every size in `--sizes` and times the list, count, add and remove calls against
+each. The per call latencies are reported as json, the run exits with status 1 when
+the p50 of any call on the largest history is more than `--max-growth` times its p50
+on the smallest one. The count is an index only scan of the user's primary key range,
+it is reported but can't be constant and is left out of that check.
+
+    python -m benchmarks.user_history --sizes 100,1000,10000,100000
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+
+def percentile(samples, percent: float) -> float:
+    samples = sorted(samples)
+    index = min(int(round(percent / 100 * (len(samples) - 1))), len(samples) - 1)
+    return samples[index]
+
+
+def seed(engine, tables, user_id: int, size: int):
+    from sqlalchemy import insert, delete
+
+    with engine.begin() as connection:
+        for table in tables:
+            connection.execute(delete(table).where(table.c.user_id == user_id))
+            connection.execute(
+                insert(table),
+                [
+                    {"user_id": user_id, "content_id": content_id}
+                    for content_id in range(1, size + 1)
+                ],
+            )
+
+
+def time_calls(client, method: str, url: str, repeat: int, **kwargs):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"{method} {url}: {response.status_code} {response.text}"
+            )
+    return {
+        "mean": round(statistics.fmean(latencies) * 1000, 3),
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p95": round(percentile(latencies, 95) * 1000, 3),
+    }
+
+
+def run(args):
+    # the app reads its database from the environment at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.database}"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    from sqlalchemy import insert
+    from fastapi.testclient import TestClient
+
+    import main
+    from auth import FullUser, is_user
+    from models import (
+        User,
+        Content,
+        engine,
+        user_watched_content_association,
+        user_favorite_content_association,
+    )
+    from models.user_content_device_models import Base
+
+    Base.metadata.create_all(engine)
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User),
+            [
+                {
+                    "id": 1,
+                    "username": "bench",
+                    "email": "bench@example.com",
+                    "password": "-",
+                    "name": "bench",
+                    "phone_number": "00000000000",
+                    "type": "user",
+                }
+            ],
+        )
+        connection.execute(
+            insert(Content),
+            [
+                {"title": f"content {i}", "duration": 3600, "available": True}
+                for i in range(sizes[-1] + 1)
+            ],
+        )
+    user = FullUser(
+        id=1,
+        username="bench",
+        email="bench@example.com",
+        password="benchmark",
+        name="bench",
+        phone_number="00000000000",
+    )
+    # token checks cost the same for every history size, keep them out of the numbers
+    main.app.dependency_overrides[is_user] = lambda: user
+    client = TestClient(main.app)
+    # the last content id is never part of a history, it's added and removed
+    extra_id = sizes[-1] + 1
+    results = {}
+    for size in sizes:
+        seed(
+            engine,
+            [user_watched_content_association, user_favorite_content_association],
+            user.id,
+            size,
+        )
+        results[size] = {
+            "list_watched": time_calls(
+                client, "GET", "/actions/watch?limit=100", args.repeat
+            ),
+            "count_watched": time_calls(
+                client, "GET", "/actions/watch/count", args.repeat
+            ),
+            "add_watched": time_calls(
+                client,
+                "POST",
+                "/actions/watch",
+                args.repeat,
+                json={"content_id": extra_id},
+            ),
+            "remove_watched": time_calls(
+                client, "DELETE", f"/actions/watch/{extra_id}", args.repeat
+            ),
+            "list_favourites": time_calls(
+                client, "GET", "/actions/favourites?limit=100", args.repeat
+            ),
+            "add_favourite": time_calls(
+                client,
+                "POST",
+                "/actions/favourites",
+                args.repeat,
+                json={"content_id": extra_id},
+            ),
+        }
+    growth = {
+        call: round(results[sizes[-1]][call]["p50"] / results[sizes[0]][call]["p50"], 2)
+        for call in results[sizes[0]]
+    }
+    return {
+        "repeat": args.repeat,
+        "latency_ms": results,
+        "p50_growth": growth,
+        "max_growth": args.max_growth,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--max-growth", type=float, default=3.0)
+    parser.add_argument(
+        "--database",
+        default=os.path.join(tempfile.mkdtemp(), "user_history.db"),
+        help="sqlite file to build, must not exist yet",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    growth = max(
+        value for call, value in result["p50_growth"].items() if call != "count_watched"
+    )
+    return 0 if growth <= args.max_growth else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,29 @@
 import os
+import sys
+import shutil
 import logging
+import tempfile
 from multiprocessing import cpu_count
 
+# gunicorn adds the project root to sys.path only after reading this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.cache.catalogue import default_version_file, domain_port  # noqa: E402
+
 logger = logging.getLogger(f"TV_backend.{__name__}")
-port = int(os.getenv("DOMAIN", "http://127.0.0.1:8013").split(":")[2])
+port = domain_port()
+
+# workers inherit the master's environment, so they all watch the same catalogue
+# version file and drop their in-memory catalogue cache when another worker bumps it
+os.environ.setdefault("CATALOGUE_VERSION_FILE", default_version_file())
+# the same for the cached users, so a user change applies in every worker
+os.environ.setdefault("USER_VERSION_FILE", default_version_file("user"))
+
+# every worker writes its metric samples here, /metrics on any worker sums them up
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), f"tv_backend_{port}_metrics"),
+)
 
 
 def max_workers():
@@ -14,6 +34,23 @@ timeout = False
 preload_app = False
 wsgi_app = "main:app"
 workers = max_workers()
-graceful_timeout = False
+# lets models.common_engine size each worker's connection pool
+os.environ.setdefault("DB_POOL_WORKERS", str(workers))
+# leave workers time to flush buffered playback positions on shutdown
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
 bind = f"0.0.0.0:{port}"
 worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # samples left by a previous run would be added to this one's
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # drops the dead worker's in-flight and open socket gauges
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,13 +1,17 @@
 import uvicorn
 import traceback
-import logging.config
+import logging
 from http import HTTPStatus
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from utils.response import ReturnResponse
-from utils.log_utils import LOGGING_CONFIG
+from utils.compression import CompressionMiddleware
+from utils.tracing import TRACE_SAMPLE_RATE, TracingMiddleware
+from models.instrumentation import QueryStatsMiddleware
+from utils.log_utils import LOGGING_CONFIG, configure_logging
 from apps import (
     genres_router,
     content_router,
@@ -15,11 +19,34 @@ from apps import (
     actions_router,
     device_router,
     sync_router,
+    monitoring_router,
+    metrics_router,
 )
+from apps.synchronization import position_buffer, sync_hub
+from apps.content.router import warm_available_catalogue
+from apps.content.search import title_index
+from apps.monitoring.metrics import MetricsMiddleware, runtime_metrics
 
-logging.config.dictConfig(LOGGING_CONFIG)
+configure_logging(LOGGING_CONFIG)
 logger = logging.getLogger("TV_backend")
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    position_buffer.start()
+    await sync_hub.start()
+    await warm_available_catalogue()
+    # searches use the database until the title index is built
+    title_index.refresh_if_stale()
+    runtime_metrics.start()
+    yield
+    runtime_metrics.stop()
+    await sync_hub.stop()
+    # write out the playback positions still waiting in the buffer
+    await position_buffer.stop()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.include_router(genres_router)
 app.include_router(content_router)
@@ -27,6 +54,8 @@ app.include_router(users_router)
 app.include_router(actions_router)
 app.include_router(device_router)
 app.include_router(sync_router)
+app.include_router(monitoring_router)
+app.include_router(metrics_router)
 
 
 @app.get("/")
@@ -40,17 +69,21 @@ async def catch_exceptions_middleware(request, call_next):
     except Exception as e:
         logger.error(e)
         logger.error(traceback.format_exc())
-        return JSONResponse(
+        return ReturnResponse.return_response(
             status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
-            content=ReturnResponse.return_response(
-                status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
-                is_success=False,
-                errors=[str(e)],
-            ),
+            is_success=False,
+            errors=[str(e)],
         )
 
 
 app.middleware("http")(catch_exceptions_middleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
+# added last so it is outermost and also compresses the error envelopes
+app.add_middleware(CompressionMiddleware)
+# opt-in, outermost so response.write times the real write to the server
+if TRACE_SAMPLE_RATE > 0:
+    app.add_middleware(TracingMiddleware, sample_rate=TRACE_SAMPLE_RATE)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", port=8000)
@@ -1,4 +1,33 @@
-from models.common_engine import engine, Session
-from models.user_content_device_models import User, Content, Device, Genre, UserWatchingContent
+from models.common_engine import (
+    engine,
+    Session,
+    async_engine,
+    async_session,
+    AsyncSession,
+)
+from models.user_content_device_models import (
+    User,
+    Content,
+    Device,
+    Genre,
+    UserWatchingContent,
+    content_genre_association,
+    user_watched_content_association,
+    user_favorite_content_association,
+)
 
-__all__ = ["User", "Content", "Device", "Genre", "engine", "Session", "UserWatchingContent"]
+__all__ = [
+    "User",
+    "Content",
+    "Device",
+    "Genre",
+    "engine",
+    "Session",
+    "async_engine",
+    "async_session",
+    "AsyncSession",
+    "UserWatchingContent",
+    "content_genre_association",
+    "user_watched_content_association",
+    "user_favorite_content_association",
+]
@@ -2,7 +2,11 @@ import os
 
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from models.pool import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+from models.instrumentation import instrument
 
 
 load_dotenv()
@@ -12,8 +16,62 @@ database = os.getenv("DATABASE")
 password = os.getenv("MYSQL_PASSWORD")
 user = os.getenv("MYSQL_USERNAME")
 
-connection_string = f"mysql+mysqlconnector://{user}:{password}@{host}/{database}"
+# DATABASE_URL overrides the mysql settings, e.g. sqlite:///./tv.db for local testing
+connection_string = (
+    os.getenv("DATABASE_URL")
+    or f"mysql+mysqlconnector://{user}:{password}@{host}/{database}"
+)
+
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+async_connection_string = os.getenv("ASYNC_DATABASE_URL") or to_async_url(
+    connection_string
+)
+
+# gunicorn_config exports its worker count, a single process (uvicorn, scripts) counts as 1
+DB_POOL_WORKERS = int(os.getenv("DB_POOL_WORKERS", "1"))
+# total mysql connections this host may open, split evenly between the workers
+DB_MAX_CONNECTIONS = os.getenv("DB_MAX_CONNECTIONS")
+
+
+def pool_options(poolclass):
+    if make_url(connection_string).get_backend_name() == "sqlite":
+        return {}
+    if DB_MAX_CONNECTIONS:
+        pool_size = max(int(DB_MAX_CONNECTIONS) // DB_POOL_WORKERS, 1)
+        max_overflow = 0
+    else:
+        pool_size, max_overflow = 5, 10
+    return {
+        "poolclass": poolclass,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", pool_size)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", max_overflow)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # recycle well below mysql's wait_timeout so idle connections are never stale
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
 
-engine = create_engine(connection_string)
+# the sync engine is kept for migrations and command line tools, the app uses async_engine
+engine = create_engine(connection_string, **pool_options(InstrumentedQueuePool))
+async_engine = create_async_engine(
+    async_connection_string, **pool_options(InstrumentedAsyncQueuePool)
+)
+# query counts, db time and slow statements, see models.instrumentation
+instrument(engine)
+instrument(async_engine.sync_engine)
+# objects are used after commit to build responses, so don't expire them
+async_session = async_sessionmaker(async_engine, expire_on_commit=False)
 
-__all__ = ["engine", "Session"]
+__all__ = ["engine", "Session", "async_engine", "async_session", "AsyncSession"]
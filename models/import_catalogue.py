@@ -0,0 +1,50 @@
+"""
+bulk loads a content catalogue from an ndjson or csv file, see apps/content/importer.py
+
+    python ./models/import_catalogue.py catalogue.ndjson --create-genres
+
+run it with the DOMAIN (or the CATALOGUE_VERSION_FILE) of the server so it bumps the
+version file the server's workers watch and they drop their cached catalogue
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# allow running as `python ./models/import_catalogue.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.content.importer import (  # noqa: E402
+    IMPORT_CHUNK_SIZE,
+    CatalogueImport,
+    import_format_of,
+    read_rows,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"])
+    parser.add_argument("--create-genres", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    importer = CatalogueImport(
+        create_genres=args.create_genres, chunk_size=args.chunk_size
+    )
+    with open(args.path, encoding="utf-8-sig", newline="") as lines:
+        report = asyncio.run(
+            importer.run(read_rows(lines, args.format or import_format_of(args.path)))
+        )
+    print(json.dumps(report, indent=2))
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,186 @@
+import os
+import logging
+import threading
+from time import perf_counter_ns
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from utils.tracing import add_span
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+# statements slower than this are logged with the route that ran them, 0 disables
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# "true" logs the query count and db time of every request and sync message
+DB_STATS_LOG = os.getenv("DB_STATS_LOG", "false").lower() == "true"
+
+
+class QueryStats:
+    """statements run and seconds spent in the database by one request or message"""
+
+    __slots__ = ("_route", "scope", "count", "duration")
+
+    def __init__(self, route: Optional[str] = None, scope=None):
+        self._route = route
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+
+    @property
+    def route(self) -> Optional[str]:
+        # routing fills in the scope after the middleware ran, resolve it lazily
+        if self._route is None and self.scope is not None:
+            return route_of(self.scope)
+        return self._route
+
+    def record(self, duration: float):
+        self.count += 1
+        self.duration += duration
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+
+
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+# count_queries() blocks, they see the statements of every task and thread
+_counters: List[QueryStats] = []
+_counters_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter_ns())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    duration_ns = perf_counter_ns() - started
+    duration = duration_ns / 1e9
+    add_span("sql", started, duration_ns, statement=statement[:200])
+    stats = query_stats.get()
+    if stats is not None:
+        stats.record(duration)
+    if _counters:
+        with _counters_lock:
+            for counter in _counters:
+                counter.record(duration)
+    if SLOW_QUERY_MS and duration * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else None
+        logger.warning(
+            f"Slow query route={route} duration_ms={duration * 1000:.2f} "
+            f"statement={' '.join(statement.split())[:500]}"
+        )
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument(engine):
+    """times every statement of a sync engine, pass async_engine.sync_engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def track_queries(route: Optional[str] = None):
+    """
+    collects the statements run by the current task in a fresh QueryStats, for
+    work outside of an http request like a sync message, logged on DB_STATS_LOG
+    """
+    stats = QueryStats(route)
+    token = query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats.reset(token)
+        if DB_STATS_LOG:
+            log_stats(stats)
+
+
+@contextmanager
+def count_queries():
+    """
+    counts every statement run while the block is open, whatever task or thread
+    runs it, so tests can bound the queries of an endpoint called through a client
+
+        with count_queries() as stats:
+            client.get("/content/")
+        assert stats.count <= 2
+    """
+    stats = QueryStats()
+    with _counters_lock:
+        _counters.append(stats)
+    try:
+        yield stats
+    finally:
+        with _counters_lock:
+            _counters.remove(stats)
+
+
+# endpoint -> path template, filled in as routes are first hit
+_route_paths: Dict[Callable, str] = {}
+
+
+def route_of(scope) -> str:
+    """the path template of the matched route, the raw path before routing"""
+    endpoint = scope.get("endpoint")
+    path = _route_paths.get(endpoint)
+    if path is not None:
+        return path
+    app = scope.get("app")
+    if app is not None and endpoint is not None:
+        for route in getattr(app, "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint:
+                _route_paths[endpoint] = route.path
+                return route.path
+    return scope["path"]
+
+
+class QueryStatsMiddleware:
+    """
+    tracks the queries of every http request, adds them to the response as a
+    `Server-Timing: db` entry and logs them when DB_STATS_LOG is on
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(scope=scope)
+        token = query_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+                if DB_STATS_LOG:
+                    log_stats(stats, method=scope["method"], status=message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats.reset(token)
+
+
+def log_stats(stats: QueryStats, **fields):
+    fields = {
+        "route": stats.route,
+        **fields,
+        "queries": stats.count,
+        "db_ms": f"{stats.duration * 1000:.2f}",
+    }
+    logger.info(
+        "DB usage " + " ".join(f"{name}={value}" for name, value in fields.items())
+    )
@@ -0,0 +1,73 @@
+import threading
+from time import perf_counter
+
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+class InstrumentedPoolMixin:
+    """
+    times how long every checkout waits for a free connection,
+    `metrics` lives on the class so it survives pool.recreate()
+    """
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record(perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(perf_counter() - started)
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    metrics = PoolMetrics()
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+def pool_stats(pool):
+    if not isinstance(pool, QueuePool):
+        return {"pool": pool.status()}
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # sqlalchemy counts unopened pool slots as negative overflow
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+    }
+    if isinstance(pool, InstrumentedPoolMixin):
+        stats.update(pool.metrics.snapshot())
+    return stats
@@ -1,13 +1,140 @@
+import os
+import sys
 import logging
 
-from common_engine import engine
-from user_content_device_models import Base as UserBase
+from sqlalchemy import (
+    MetaData,
+    String,
+    Table,
+    and_,
+    bindparam,
+    inspect,
+    select,
+    text,
+    update,
+)
+
+# allow running as `python ./models/run_migrations.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.common_engine import engine  # noqa: E402
+from models.user_content_device_models import Base as UserBase  # noqa: E402
+from utils.time_format import hms_to_seconds  # noqa: E402
 
 logger = logging.getLogger(f"TV_backend.{__name__}")
 
+# columns that used to hold HH:MM:SS strings and now hold integer seconds
+HMS_COLUMNS = [("content", "duration"), ("user_watching_content", "timestamp")]
+# columns added to existing tables, with the value existing rows get
+ADDED_COLUMNS = [
+    ("user_watching_content", "updated_at", "DATETIME", "CURRENT_TIMESTAMP"),
+]
+
+
+def add_missing_column(
+    connection, table_name: str, column_name: str, column_type: str, backfill: str
+) -> bool:
+    columns = {column["name"] for column in inspect(connection).get_columns(table_name)}
+    added = column_name not in columns
+    if added:
+        connection.execute(
+            text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+        )
+    # ALTER TABLE commits on mysql, so a run that failed after it is finished here
+    connection.execute(
+        text(
+            f"UPDATE {table_name} SET {column_name} = {backfill} "
+            f"WHERE {column_name} IS NULL"
+        )
+    )
+    return added
+
+
+def create_missing_indexes(connection):
+    for table in UserBase.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def hms_value_to_seconds(value: str):
+    if value.strip().isdigit():
+        return int(value)
+    return hms_to_seconds(value)
+
+
+def convert_hms_column(connection, table_name: str, column_name: str) -> bool:
+    """
+    rerunnable, ALTER TABLE commits on mysql so a run that failed half way picks up
+    where it stopped, values that aren't HH:MM:SS become NULL and are counted
+    """
+    columns = {
+        column["name"]: column for column in inspect(connection).get_columns(table_name)
+    }
+    seconds_column = f"{column_name}_seconds"
+    if column_name not in columns and seconds_column in columns:
+        # a previous run stopped between the DROP and the RENAME
+        rename_column(connection, table_name, seconds_column, column_name)
+        return True
+    if not isinstance(columns[column_name]["type"], String):
+        return False
+    if seconds_column not in columns:
+        connection.execute(
+            text(f"ALTER TABLE {table_name} ADD COLUMN {seconds_column} INTEGER")
+        )
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    primary_key = list(table.primary_key.columns)
+    # converted in python so the same migration runs on mysql and sqlite
+    rows = connection.execute(select(*primary_key, table.c[column_name])).all()
+    values = []
+    invalid = 0
+    for row in rows:
+        row_values = {
+            f"pk_{column.name}": row[index] for index, column in enumerate(primary_key)
+        }
+        try:
+            row_values["seconds"] = hms_value_to_seconds(row[-1]) if row[-1] else None
+        except ValueError:
+            row_values["seconds"] = None
+            invalid += 1
+        values.append(row_values)
+    if invalid:
+        logger.warning(
+            f"Stored {invalid} values of {table_name}.{column_name} as NULL, "
+            f"they were not HH:MM:SS"
+        )
+    if values:
+        matches_row = and_(
+            *(column == bindparam(f"pk_{column.name}") for column in primary_key)
+        )
+        connection.execute(
+            update(table)
+            .where(matches_row)
+            .values({seconds_column: bindparam("seconds")}),
+            values,
+        )
+    connection.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {column_name}"))
+    rename_column(connection, table_name, seconds_column, column_name)
+    return True
+
+
+def rename_column(connection, table_name: str, old_name: str, new_name: str):
+    connection.execute(
+        text(f"ALTER TABLE {table_name} RENAME COLUMN {old_name} TO {new_name}")
+    )
+
 
 try:
     UserBase.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table_name, column_name in HMS_COLUMNS:
+            if convert_hms_column(connection, table_name, column_name):
+                logger.info(f"Converted {table_name}.{column_name} to seconds")
+        for table_name, column_name, column_type, backfill in ADDED_COLUMNS:
+            if add_missing_column(
+                connection, table_name, column_name, column_type, backfill
+            ):
+                logger.info(f"Added {table_name}.{column_name}")
+        create_missing_indexes(connection)
     logger.info("Created successfully!")
 except Exception as e:
     logger.error(f"Connection failed: {e}")
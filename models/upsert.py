@@ -0,0 +1,47 @@
+from typing import List, Optional
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import mysql, sqlite
+
+
+def upsert_statement(
+    dialect_name: str,
+    table: Table,
+    update_columns: List[str],
+    update_values: Optional[dict] = None,
+):
+    """
+    INSERT .. ON DUPLICATE KEY UPDATE (mysql) / ON CONFLICT DO UPDATE (sqlite),
+    meant to be executed with a list of rows as one executemany, `update_columns`
+    take the row's value and `update_values` set sql expressions like func.now()
+    """
+    if dialect_name == "mysql":
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update(
+            {
+                **{column: statement.inserted[column] for column in update_columns},
+                **(update_values or {}),
+            }
+        )
+    if dialect_name == "sqlite":
+        statement = sqlite.insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={
+                **{column: statement.excluded[column] for column in update_columns},
+                **(update_values or {}),
+            },
+        )
+    raise NotImplementedError(f"upsert is not supported for {dialect_name}")
+
+
+def insert_ignore_statement(dialect_name: str, table: Table):
+    """
+    INSERT IGNORE (mysql) / ON CONFLICT DO NOTHING (sqlite), rows that already
+    exist are skipped instead of raising an IntegrityError
+    """
+    if dialect_name == "mysql":
+        return mysql.insert(table).prefix_with("IGNORE")
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    raise NotImplementedError(f"insert ignore is not supported for {dialect_name}")
@@ -1,6 +1,16 @@
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, Boolean
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    Table,
+    Boolean,
+    DateTime,
+    Index,
+    func,
+)
 
 Base = declarative_base()
 
@@ -32,9 +42,15 @@ user_watched_content_association = Table(
 
 class UserWatchingContent(Base):
     __tablename__ = "user_watching_content"
+    # "continue watching" reads a user's most recently updated rows through this index
+    __table_args__ = (
+        Index("ix_user_watching_content_recent", "user_id", "updated_at"),
+    )
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     content_id = Column(Integer, ForeignKey("content.id"), primary_key=True)
-    timestamp = Column(String(8))
+    # playback position in seconds
+    timestamp = Column(Integer)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user = relationship("User", back_populates="watching_content")
     content = relationship("Content", back_populates="watching_user")
 
@@ -87,10 +103,18 @@ content_genre_association = Table(
 
 class Content(Base):
     __tablename__ = "content"
+    # title search falls back to MATCH .. AGAINST when the in-process index is off
+    __table_args__ = (
+        Index("ix_content_title_fulltext", "title", mysql_prefix="FULLTEXT").ddl_if(
+            dialect="mysql"
+        ),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(100))
-    duration = Column(String(8))
-    available = Column(Boolean, default=True)
+    # length in seconds
+    duration = Column(Integer)
+    # also serves keyset pages of the available catalogue, innodb appends the id
+    available = Column(Boolean, default=True, index=True)
 
     watched_user = relationship(
         "User",
@@ -0,0 +1,75 @@
+import os
+import atexit
+import shutil
+import tempfile
+
+import pytest
+
+# models and the caches read their settings at import time, so the test database,
+# catalogue version file and log directory are set up before the app is imported
+TEST_DIR = tempfile.mkdtemp(prefix="tv_backend_tests_")
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["CATALOGUE_VERSION_FILE"] = os.path.join(TEST_DIR, "catalogue_version")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+# the file log handlers write to ./logs
+os.chdir(TEST_DIR)
+
+PASSWORD = "password1"
+
+
+def seed(session):
+    from auth.security import pwd_context
+    from models import User, Content, Genre
+
+    password = pwd_context.hash(PASSWORD)
+    session.add_all(
+        [
+            User(
+                username=username,
+                email=f"{username}@example.com",
+                password=password,
+                name=username,
+                phone_number="01234567890",
+                type=user_type,
+            )
+            for username, user_type in (("admin", "admin"), ("viewer", "user"))
+        ]
+    )
+    drama, comedy = Genre(name="drama"), Genre(name="comedy")
+    session.add_all([drama, comedy])
+    for number in range(20):
+        content = Content(
+            title=f"Title {number}", duration=3600, available=number % 2 == 0
+        )
+        content.genres = [drama, comedy] if number % 3 == 0 else [drama]
+        session.add(content)
+    session.commit()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from sqlalchemy.orm import Session
+
+    import main
+    from models import engine
+    from models.user_content_device_models import Base
+
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        seed(session)
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def login(client, username: str) -> dict:
+    response = client.post(
+        "/security/token", data={"username": username, "password": PASSWORD}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def user_headers(client):
+    return login(client, "viewer")
@@ -0,0 +1,55 @@
+from utils.cache import invalidate_catalogue
+from models.instrumentation import count_queries
+from apps.content.search import title_index
+
+
+def test_only_available_returns_available_content(client, user_headers):
+    response = client.get(
+        "/content/",
+        params={"only_available": "true", "limit": 50},
+        headers=user_headers,
+    )
+
+    assert response.status_code == 200
+    content = response.json()["data"]["content"]
+    assert len(content) == 10
+    assert all(item["available"] is True for item in content)
+
+
+def test_all_content_includes_unavailable(client, user_headers):
+    response = client.get("/content/", params={"limit": 50}, headers=user_headers)
+
+    assert response.status_code == 200
+    availability = {item["available"] for item in response.json()["data"]["content"]}
+    assert availability == {True, False}
+
+
+def test_content_page_query_count_does_not_grow_with_the_page(client, user_headers):
+    # a cold cache, so the page is loaded from the database
+    invalidate_catalogue()
+    with count_queries() as stats:
+        response = client.get("/content/", params={"limit": 20}, headers=user_headers)
+
+    assert response.status_code == 200
+    assert len(response.json()["data"]["content"]) == 20
+    # the page and its genres, not one genre query per content
+    assert stats.count <= 2
+
+
+def test_search_rebuilds_a_title_index_that_failed_to_build(client, user_headers):
+    # as left by a build that failed at worker start
+    title_index.index = None
+    title_index.version = None
+
+    response = client.get(
+        "/content/search", params={"q": "title"}, headers=user_headers
+    )
+
+    assert response.status_code == 200
+    assert title_index._rebuild is not None
+
+    async def wait_for_rebuild():
+        await title_index._rebuild
+
+    client.portal.call(wait_for_rebuild)
+    assert title_index.ready
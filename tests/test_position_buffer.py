@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import event, select
+
+from models import async_engine, async_session, UserWatchingContent
+from apps.synchronization.buffer import PositionBuffer
+
+VIEWER_ID = 2
+DELETED_CONTENT_ID = 999
+
+
+def enable_foreign_keys(dbapi_connection, _record):
+    # sqlite leaves foreign keys unchecked unless asked, mysql always checks them
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture
+def foreign_keys(client):
+    event.listen(async_engine.sync_engine, "connect", enable_foreign_keys)
+    client.portal.call(async_engine.dispose)
+    yield
+    event.remove(async_engine.sync_engine, "connect", enable_foreign_keys)
+    client.portal.call(async_engine.dispose)
+
+
+async def stored_position(user_id: int, content_id: int):
+    async with async_session() as session:
+        return await session.scalar(
+            select(UserWatchingContent.timestamp).filter_by(
+                user_id=user_id, content_id=content_id
+            )
+        )
+
+
+def test_flush_drops_positions_of_deleted_content(client, foreign_keys):
+    buffer = PositionBuffer(interval=60, max_pending=100)
+    buffer.put(VIEWER_ID, 1, 30)
+    buffer.put(VIEWER_ID, DELETED_CONTENT_ID, 40)
+
+    client.portal.call(buffer.flush)
+
+    assert buffer.pending == {}
+    assert buffer.flushed_rows == 1
+    assert buffer.dropped_rows == 1
+    assert client.portal.call(stored_position, VIEWER_ID, 1) == 30
+
+
+def test_flush_gives_up_on_positions_that_keep_failing(client, foreign_keys):
+    buffer = PositionBuffer(interval=60, max_pending=100, max_retries=2)
+
+    async def failing_write(batch):
+        raise ValueError("bad row")
+
+    buffer._write = failing_write
+    buffer.put(VIEWER_ID, 1, 50)
+
+    client.portal.call(buffer.flush)
+    assert (VIEWER_ID, 1) in buffer.pending
+    client.portal.call(buffer.flush)
+    assert buffer.pending == {}
+    assert buffer.dropped_rows == 1
@@ -0,0 +1,14 @@
+import pytest
+
+from utils.time_format.time_format import parse_seconds, seconds_to_hms
+
+
+@pytest.mark.parametrize("seconds", [0, 59, 3600, 86399, 90000, 400000])
+def test_hms_round_trip(seconds):
+    assert parse_seconds(seconds_to_hms(seconds)) == seconds
+
+
+@pytest.mark.parametrize("value", ["1:00:00", "00:60:00", "00:00:60", "aa:00:00"])
+def test_invalid_hms_is_rejected(value):
+    with pytest.raises(ValueError):
+        parse_seconds(value)
@@ -0,0 +1,17 @@
+from utils.cache.ttl_cache import TTLCache
+from utils.cache.catalogue import (
+    VersionFile,
+    VersionedCache,
+    catalogue_cache,
+    default_version_file,
+    invalidate_catalogue,
+)
+
+__all__ = [
+    "TTLCache",
+    "VersionFile",
+    "VersionedCache",
+    "catalogue_cache",
+    "default_version_file",
+    "invalidate_catalogue",
+]
@@ -0,0 +1,167 @@
+import os
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # windows, where the app runs as a single process
+    fcntl = None
+
+from utils.cache.ttl_cache import TTLCache, MISSING
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+# DOMAIN may come from .env, read before the version file path is derived from it
+load_dotenv()
+
+CATALOGUE_CACHE_TTL = float(os.getenv("CATALOGUE_CACHE_TTL", "300"))
+CATALOGUE_CACHE_SIZE = int(os.getenv("CATALOGUE_CACHE_SIZE", "1024"))
+DEFAULT_DOMAIN = "http://127.0.0.1:8013"
+
+
+def domain_port() -> int:
+    """the port of DOMAIN, the one gunicorn binds to"""
+    return int(os.getenv("DOMAIN", DEFAULT_DOMAIN).split(":")[2])
+
+
+def default_version_file(name: str = "catalogue") -> str:
+    """
+    one version file per port so two servers on a host don't share it, the server's
+    workers and the import cli derive the same path from DOMAIN
+    """
+    return os.path.join(
+        tempfile.gettempdir(), f"tv_backend_{domain_port()}.{name}_version"
+    )
+
+
+CATALOGUE_VERSION_FILE = os.getenv("CATALOGUE_VERSION_FILE") or default_version_file()
+
+
+class VersionFile:
+    """
+    version counter shared by all the workers of a host through a small file,
+    readers only stat() the file and re-read it when it was replaced, writers take an
+    flock() so two processes bumping at once can't both write the same version
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stamp = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp != self._stamp:
+            try:
+                with open(self.path) as version_file:
+                    self._version = int(version_file.read().strip() or 0)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading {self.path}: {e.__class__.__name__}:{e}")
+                return self._version
+            self._stamp = stamp
+        return self._version
+
+    @contextmanager
+    def _locked(self):
+        # the version file is replaced on every bump, so the lock is a file beside it
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # closing the file releases the lock
+                yield
+
+    def _read(self) -> int:
+        try:
+            with open(self.path) as version_file:
+                return int(version_file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError as e:
+            logger.error(f"Error reading {self.path}: {e.__class__.__name__}:{e}")
+            return self._version
+
+    def bump(self) -> int:
+        with self._locked():
+            # read under the lock, the stat() stamp of current() may be a bump behind
+            version = self._read() + 1
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as version_file:
+                version_file.write(str(version))
+            # os.replace is atomic, other workers never see a half written file
+            os.replace(tmp_path, self.path)
+            return version
+
+
+class VersionedCache:
+    """
+    TTLCache that every worker clears when the shared version file moves, so a write
+    in one worker invalidates the entries of all of them
+    """
+
+    def __init__(self, version: VersionFile, maxsize: int, ttl: float):
+        self.version = version
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._seen_version = None
+
+    def _sync(self) -> int:
+        version = self.version.current()
+        if version != self._seen_version:
+            self.cache.clear()
+            self._seen_version = version
+        return version
+
+    def _store(self, key, value, version: int, cache_none: bool):
+        # an admin write during the load means the value may already be stale
+        if (value is not None or cache_none) and self.version.current() == version:
+            self.cache.set(key, value)
+
+    def get_or_load(self, key, loader, cache_none: bool = True):
+        version = self._sync()
+        value = self.cache.get(key, MISSING)
+        if value is MISSING:
+            value = loader()
+            self._store(key, value, version, cache_none)
+        return value
+
+    async def get_or_load_async(self, key, loader, cache_none: bool = True):
+        version = self._sync()
+        value = self.cache.get(key, MISSING)
+        if value is MISSING:
+            value = await loader()
+            self._store(key, value, version, cache_none)
+        return value
+
+    def invalidate(self) -> int:
+        self.cache.clear()
+        self._seen_version = self.version.bump()
+        return self._seen_version
+
+
+catalogue_cache = VersionedCache(
+    VersionFile(CATALOGUE_VERSION_FILE),
+    maxsize=CATALOGUE_CACHE_SIZE,
+    ttl=CATALOGUE_CACHE_TTL,
+)
+
+
+def invalidate_catalogue() -> Optional[int]:
+    """the bumped catalogue version, None when the version file can't be written"""
+    try:
+        return catalogue_cache.invalidate()
+    except OSError as e:
+        catalogue_cache.cache.clear()
+        logger.error(f"Error bumping catalogue version: {e.__class__.__name__}:{e}")
+        return None
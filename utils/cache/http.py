@@ -0,0 +1,92 @@
+import os
+import hashlib
+from http import HTTPStatus
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from utils.response import ReturnResponse
+from utils.compression import COMPRESSION_MIN_SIZE, choose_encoding, compress_async
+
+# catalogue responses only change on admin writes, a CDN or the box may reuse them
+CATALOGUE_CACHE_CONTROL = os.getenv("CATALOGUE_CACHE_CONTROL", "public, max-age=60")
+
+
+class CachedBody:
+    """
+    a rendered json body with its strong etag, the etag hashes the bytes so every
+    worker and host hands out the same etag for the same catalogue. compressed
+    copies are made on first request per encoding and kept with the body
+    """
+
+    __slots__ = ("body", "etag", "compressed")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.compressed: Dict[str, bytes] = {}
+
+    @classmethod
+    def ok(cls, data) -> "CachedBody":
+        return cls(
+            ReturnResponse.return_response(
+                status_code=HTTPStatus.OK.value, is_success=True, data=data
+            ).body
+        )
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # every encoding is its own representation and needs its own strong etag
+        return f'{self.etag[:-1]}-{encoding}"' if encoding else self.etag
+
+    async def encoded(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        body = self.compressed.get(encoding)
+        if body is None:
+            body = self.compressed[encoding] = await compress_async(self.body, encoding)
+        return body
+
+
+async def render_ok(loader):
+    """awaits loader() and renders its data as a 200 body, None stays None"""
+    data = await loader()
+    return None if data is None else CachedBody.ok(data)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison, W/"x" matches "x", and any encoding of
+    the body matches, "x-gzip" is as fresh as "x"
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (
+        tag.strip().removeprefix("W/").split("-")[0].rstrip('"') + '"'
+        for tag in if_none_match.split(",")
+    )
+
+
+async def cached_response(
+    request: Request, cached: CachedBody, cache_control: str = CATALOGUE_CACHE_CONTROL
+) -> Response:
+    encoding = None
+    if len(cached.body) >= COMPRESSION_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": cached.etag_for(encoding),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request, cached.etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED.value, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=await cached.encoded(encoding),
+        status_code=HTTPStatus.OK.value,
+        media_type="application/json",
+        headers=headers,
+    )
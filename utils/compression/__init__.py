@@ -0,0 +1,15 @@
+from utils.compression.compression import (
+    COMPRESSION_MIN_SIZE,
+    CompressionMiddleware,
+    choose_encoding,
+    compress,
+    compress_async,
+)
+
+__all__ = [
+    "COMPRESSION_MIN_SIZE",
+    "CompressionMiddleware",
+    "choose_encoding",
+    "compress",
+    "compress_async",
+]
@@ -0,0 +1,151 @@
+import os
+import gzip
+import asyncio
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils.tracing import span
+
+try:
+    import brotli
+except ImportError:  # the optional "compression" extra
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# server preference order, encodings whose package isn't installed are skipped
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip")
+# smaller bodies aren't worth the cpu, they mostly fit in one packet anyway
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_CONTENT_TYPES = os.getenv(
+    "COMPRESSION_CONTENT_TYPES",
+    "application/json,text/html,text/plain,text/css,application/javascript",
+)
+# bodies above this are compressed in a thread so the event loop keeps going
+COMPRESSION_THREAD_SIZE = int(os.getenv("COMPRESSION_THREAD_SIZE", "262144"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+
+def available_compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    compressors = {"gzip": lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL)}
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        compressors["zstd"] = compressor.compress
+    return compressors
+
+
+COMPRESSORS = available_compressors()
+ENCODINGS = [
+    encoding.strip()
+    for encoding in COMPRESSION_ENCODINGS.split(",")
+    if encoding.strip() in COMPRESSORS
+]
+CONTENT_TYPES = {
+    content_type.strip()
+    for content_type in COMPRESSION_CONTENT_TYPES.split(",")
+    if content_type.strip()
+}
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """the first of ENCODINGS the client accepts, None for an identity response"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    return COMPRESSORS[encoding](body)
+
+
+async def compress_async(body: bytes, encoding: str) -> bytes:
+    if len(body) > COMPRESSION_THREAD_SIZE:
+        return await asyncio.to_thread(compress, body, encoding)
+    return compress(body, encoding)
+
+
+def is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in CONTENT_TYPES
+
+
+class CompressionMiddleware:
+    """
+    compresses http response bodies of an allowed content type and at least
+    `minimum_size` bytes with the best encoding the client accepts, responses that
+    are already encoded (the precompressed catalogue) are passed through untouched.
+    the body is buffered, compressed once and sent with its new Content-Length
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start = None
+        chunks = []
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                if not is_compressible(Headers(raw=message["headers"])):
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            if len(body) >= self.minimum_size:
+                with span("compress", encoding=encoding):
+                    body = await compress_async(body, encoding)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                # the bytes changed, a strong validator would now be wrong
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,3 +1,4 @@
 from utils.log_utils.config import LOGGING_CONFIG
+from utils.log_utils.queue_handler import configure_logging, queue_handlers
 
-__all__ = ["LOGGING_CONFIG"]
+__all__ = ["LOGGING_CONFIG", "configure_logging", "queue_handlers"]
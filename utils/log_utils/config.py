@@ -1,3 +1,16 @@
+import os
+
+# "json" writes one json object per line instead of the coloured text lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# "false" writes in the logging call again, for debugging the logging itself
+LOG_QUEUE = os.getenv("LOG_QUEUE", "true").lower() == "true"
+# records waiting for the logging thread, beyond that LOG_QUEUE_OVERFLOW applies
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# drop_new, drop_old or block
+LOG_QUEUE_OVERFLOW = os.getenv("LOG_QUEUE_OVERFLOW", "drop_new")
+LOG_FORMATTER = "json" if LOG_FORMAT == "json" else "default"
+LOG_HANDLERS = ["console", "info_filter", "warning_filter"]
+
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -8,7 +21,8 @@ LOGGING_CONFIG = {
             "format": "{levelprefix} {name}|{asctime}:{message}",
             "datefmt": "%Y-%m-%d %H:%M:%S",
             "style": "{",
-        }
+        },
+        "json": {"()": "utils.log_utils.queue_handler.JsonLineFormatter"},
     },
     "handlers": {
         "info_filter": {
@@ -18,7 +32,7 @@ LOGGING_CONFIG = {
             "when_to": "midnight",  # rotate every midnight utc
             "intervals": 1,
             "backupCount": 7,
-            "formatter": "default",
+            "formatter": LOG_FORMATTER,
         },
         "warning_filter": {
             "level": "WARNING",
@@ -27,12 +41,12 @@ LOGGING_CONFIG = {
             "when_to": "midnight",
             "intervals": 1,
             "backupCount": 7,
-            "formatter": "default",
+            "formatter": LOG_FORMATTER,
         },
         # console logs to stderr
         "console": {
             "class": "logging.StreamHandler",
-            "formatter": "default",
+            "formatter": LOG_FORMATTER,
         },
     },
     "loggers": {
@@ -40,9 +54,18 @@ LOGGING_CONFIG = {
         # Our application code
         "": {
             "level": "INFO",
-            "handlers": ["console", "info_filter", "warning_filter"],
+            "handlers": ["queue"] if LOG_QUEUE else LOG_HANDLERS,
             # Avoid double logging because of root logger
             "propagate": False,
         }
     },
 }
+
+if LOG_QUEUE:
+    # the app logs here, a background thread runs the three handlers above
+    LOGGING_CONFIG["handlers"]["queue"] = {
+        "()": "utils.log_utils.queue_handler.BoundedQueueHandler",
+        "targets": LOG_HANDLERS,
+        "maxsize": LOG_QUEUE_SIZE,
+        "overflow": LOG_QUEUE_OVERFLOW,
+    }
@@ -0,0 +1,111 @@
+import queue
+import atexit
+import logging
+import logging.config
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+import orjson
+
+OVERFLOW_POLICIES = ("drop_new", "drop_old", "block")
+# every handler built from the config, their counters are exported as metrics
+queue_handlers: List["BoundedQueueHandler"] = []
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    hands records to a bounded queue, a listener thread formats them and runs the
+    `targets` handlers (names from the same logging config) so no file write,
+    rotation or console write happens on the event loop. When the queue is full
+    `overflow` drops the new record, drops the oldest queued one or blocks
+    """
+
+    def __init__(self, targets: List[str], maxsize: int = 10000, overflow="drop_new"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        super().__init__(queue.Queue(maxsize))
+        self.targets = list(targets)
+        self.overflow = overflow
+        self.enqueued = 0
+        self.dropped = 0
+        self.listener: Optional[QueueListener] = None
+        queue_handlers.append(self)
+
+    def start(self):
+        """
+        starts the listener thread, the targets are looked up by name only now as
+        dictConfig may configure them after this handler
+        """
+        if self.listener is not None:
+            return
+        handlers = [logging._handlers[name] for name in self.targets]
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        # writes out what is still queued
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record):
+        # the targets format the record in the listener thread
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == "block":
+            self.queue.put(record)
+            self.enqueued += 1
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                self.enqueued += 1
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "drop_new":
+                    return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+    def close(self):
+        # a new dictConfig closes the handlers of the previous one
+        self.stop()
+        if self in queue_handlers:
+            queue_handlers.remove(self)
+        super().close()
+
+
+class JsonLineFormatter(logging.Formatter):
+    """one json object per line, for log shippers"""
+
+    def format(self, record) -> str:
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(line, default=str).decode()
+
+
+def configure_logging(config: dict):
+    """dictConfig, then starts the listener threads of the queue handlers"""
+    logging.config.dictConfig(config)
+    for handler in queue_handlers:
+        handler.start()
+    # registered after logging's own shutdown hook, so it runs before it and the
+    # queued records are written while the target handlers are still open
+    atexit.register(stop_queue_listeners)
+
+
+def stop_queue_listeners():
+    for handler in queue_handlers:
+        handler.stop()
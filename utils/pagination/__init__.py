@@ -0,0 +1,15 @@
+from utils.pagination.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    MAX_BATCH_SIZE,
+    keyset_page,
+    split_page,
+)
+
+__all__ = [
+    "DEFAULT_PAGE_SIZE",
+    "MAX_PAGE_SIZE",
+    "MAX_BATCH_SIZE",
+    "keyset_page",
+    "split_page",
+]
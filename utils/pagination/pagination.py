@@ -0,0 +1,24 @@
+from typing import Optional
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# items accepted by one batch request
+MAX_BATCH_SIZE = 500
+
+
+def keyset_page(query, key_column, after: Optional[int], limit: int):
+    """
+    restricts a query/select to the page that starts right after the `after` cursor,
+    one extra row is fetched so split_page can tell whether there is a next page
+    """
+    if after is not None:
+        query = query.filter(key_column > after)
+    return query.order_by(key_column).limit(limit + 1)
+
+
+def split_page(rows, key_column, limit: int):
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, getattr(rows[-1], key_column.key)
@@ -1,3 +1,3 @@
-from utils.response.response import ReturnResponse
+from utils.response.response import ReturnResponse, EnvelopeResponse, object_mapper
 
-__all__ = ["ReturnResponse"]
+__all__ = ["ReturnResponse", "EnvelopeResponse", "object_mapper"]
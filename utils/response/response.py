@@ -1,18 +1,47 @@
 from abc import ABC
-from typing import Dict
+from operator import attrgetter
+from typing import Any, Callable, Dict
+
+import orjson
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+from utils.tracing import span
+
+
+class EnvelopeResponse(ORJSONResponse):
+    """
+    orjson encodes dicts, lists, str/int/float/bool, datetimes and uuids natively,
+    anything else (pydantic models, orm objects) falls back to jsonable_encoder
+    """
+
+    def render(self, content: Any) -> bytes:
+        with span("encode"):
+            return orjson.dumps(
+                content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS
+            )
 
 
 class ReturnResponse(ABC):
     @classmethod
     def return_response(
         cls, status_code, is_success=None, data=None, errors=None
-    ) -> Dict:
+    ) -> EnvelopeResponse:
+        # returned as a response so fastapi doesn't run jsonable_encoder over it,
+        # the http status is the envelope's statusCode
         if is_success:
-            return jsonable_encoder(
-                {"statusCode": status_code, "data": data, "is_success": True}
-            )
+            content = {"statusCode": status_code, "data": data, "is_success": True}
         else:
-            return jsonable_encoder(
-                {"statusCode": status_code, "errors": errors, "is_success": False}
-            )
+            content = {"statusCode": status_code, "errors": errors, "is_success": False}
+        return EnvelopeResponse(content, status_code=status_code)
+
+
+def object_mapper(*fields: str) -> Callable[[Any], Dict[str, Any]]:
+    """
+    compiles a getter for `fields` once, the returned function maps an orm object
+    or row to a dict of those fields without any per call introspection
+    """
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        return lambda obj: {fields[0]: getter(obj)}
+    return lambda obj: dict(zip(fields, getter(obj)))
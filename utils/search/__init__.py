@@ -0,0 +1,3 @@
+from utils.search.inverted_index import InvertedIndex, tokenize
+
+__all__ = ["InvertedIndex", "tokenize"]
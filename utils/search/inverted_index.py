@@ -0,0 +1,110 @@
+import re
+import heapq
+import bisect
+from typing import Dict, List, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# a whole word match counts more than a word that only starts with the query token
+EXACT_SCORE = 2.0
+PREFIX_SCORE = 1.0
+# the document starts with the whole query, the best typeahead match
+LEADING_BONUS = 1.5
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """
+    in-memory word -> document ids index with prefix search, every query token
+    must match a word of the document, either whole or as its prefix, results are
+    ranked by how well they match and then by the shortest text
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = {}
+        # sorted vocabulary, the words sharing a prefix are one bisect away
+        self.words: List[str] = []
+        self.documents: Dict[int, Tuple[str, object]] = {}
+        # the document's words joined by single spaces, for the leading match bonus
+        self.normalized: Dict[int, str] = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, document_id: int, text: str, payload=None):
+        if document_id in self.documents:
+            self.remove(document_id)
+        self.documents[document_id] = (text or "", payload)
+        words = tokenize(text)
+        self.normalized[document_id] = " ".join(words)
+        for word in set(words):
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = set()
+                bisect.insort(self.words, word)
+            postings.add(document_id)
+
+    def remove(self, document_id: int):
+        document = self.documents.pop(document_id, None)
+        if document is None:
+            return
+        del self.normalized[document_id]
+        for word in set(tokenize(document[0])):
+            postings = self.postings.get(word)
+            if postings is None:
+                continue
+            postings.discard(document_id)
+            if not postings:
+                del self.postings[word]
+                del self.words[bisect.bisect_left(self.words, word)]
+
+    def words_with_prefix(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.words, prefix)
+        end = bisect.bisect_left(self.words, prefix + "\uffff", lo=start)
+        return self.words[start:end]
+
+    def match(self, token: str) -> Dict[int, float]:
+        scores = {}
+        for word in self.words_with_prefix(token):
+            score = EXACT_SCORE if word == token else PREFIX_SCORE
+            for document_id in self.postings[word]:
+                if scores.get(document_id, 0) < score:
+                    scores[document_id] = score
+        return scores
+
+    def search(self, query: str, limit: int, accept=None) -> List[tuple]:
+        """
+        returns up to `limit` (document_id, text, payload) tuples, best match first,
+        `accept(payload)` can filter documents out before they are ranked
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        scores = None
+        # the rarest token first keeps the intersections small
+        for token_scores in sorted((self.match(token) for token in tokens), key=len):
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    document_id: score + token_scores[document_id]
+                    for document_id, score in scores.items()
+                    if document_id in token_scores
+                }
+            if not scores:
+                return []
+        leading = " ".join(tokens)
+        ranked = []
+        for document_id, score in scores.items():
+            text, payload = self.documents[document_id]
+            if accept is not None and not accept(payload):
+                continue
+            if self.normalized[document_id].startswith(leading):
+                score += LEADING_BONUS
+            ranked.append((-score, len(text), document_id))
+        return [
+            (document_id, *self.documents[document_id])
+            for _, _, document_id in heapq.nsmallest(limit, ranked)
+        ]
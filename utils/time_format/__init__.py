@@ -0,0 +1,15 @@
+from utils.time_format.time_format import (
+    Seconds,
+    TimeFormat,
+    hms_to_seconds,
+    seconds_to_hms,
+    format_seconds,
+)
+
+__all__ = [
+    "Seconds",
+    "TimeFormat",
+    "hms_to_seconds",
+    "seconds_to_hms",
+    "format_seconds",
+]
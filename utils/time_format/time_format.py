@@ -0,0 +1,38 @@
+import re
+from typing import Annotated, Literal, Optional
+
+from pydantic import BeforeValidator, Field
+
+# hours aren't capped at 23, seconds_to_hms writes 90000 as 25:00:00 and a client
+# sending back what it read must be accepted
+HMS_PATTERN = re.compile(r"^\d{2,}:[0-5]\d:[0-5]\d$")
+
+# "hms" is the original HH:MM:SS wire format, "seconds" sends plain integers
+TimeFormat = Literal["hms", "seconds"]
+
+
+def hms_to_seconds(value: str) -> int:
+    hours, minutes, seconds = value.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def seconds_to_hms(seconds: Optional[int]) -> Optional[str]:
+    if seconds is None:
+        return None
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def format_seconds(seconds: Optional[int], time_format: TimeFormat):
+    return seconds_to_hms(seconds) if time_format == "hms" else seconds
+
+
+def parse_seconds(value):
+    if isinstance(value, str):
+        if not HMS_PATTERN.match(value):
+            raise ValueError("time must be HH:MM:SS or a number of seconds")
+        return hms_to_seconds(value)
+    return value
+
+
+# accepts both wire formats and always validates to integer seconds
+Seconds = Annotated[int, BeforeValidator(parse_seconds), Field(ge=0)]
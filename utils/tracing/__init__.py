@@ -0,0 +1,23 @@
+from utils.tracing.tracing import (
+    TRACE_SAMPLE_RATE,
+    TracingMiddleware,
+    add_span,
+    span,
+)
+from utils.tracing.profiler import (
+    ProfileFormat,
+    profile_collapsed,
+    profile_event_loop,
+    profile_lock,
+)
+
+__all__ = [
+    "TRACE_SAMPLE_RATE",
+    "TracingMiddleware",
+    "add_span",
+    "span",
+    "ProfileFormat",
+    "profile_collapsed",
+    "profile_event_loop",
+    "profile_lock",
+]
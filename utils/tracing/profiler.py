@@ -0,0 +1,65 @@
+import io
+import sys
+import time
+import pstats
+import asyncio
+import cProfile
+import threading
+from collections import Counter
+from typing import Literal
+
+ProfileFormat = Literal["collapsed", "pstats"]
+# one profile at a time per worker, two samplers would only slow each other down
+profile_lock = asyncio.Lock()
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> Counter:
+    """
+    samples the stacks of every other thread of the process every `interval`
+    seconds, like py-spy but from the inside, the counts are keyed by the
+    collapsed `thread;outermost;...;innermost` stack
+    """
+    stacks = Counter()
+    own_id = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+async def profile_collapsed(seconds: float, interval: float = 0.005) -> str:
+    """collapsed stacks, the input of flamegraph.pl and speedscope"""
+    # the sampler runs in a thread so the event loop it samples keeps serving
+    stacks = await asyncio.to_thread(sample_stacks, seconds, interval)
+    return "".join(f"{stack} {samples}\n" for stack, samples in stacks.most_common())
+
+
+async def profile_event_loop(seconds: float) -> str:
+    """
+    cProfile of everything the event loop thread runs meanwhile, all the requests
+    of this worker, as the pstats table sorted by cumulative time
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(100)
+    return output.getvalue()
@@ -0,0 +1,171 @@
+import os
+import queue
+import random
+import logging
+import tempfile
+import threading
+from time import perf_counter_ns
+from contextvars import ContextVar
+from itertools import count
+from typing import List, Optional
+
+import orjson
+
+logger = logging.getLogger(f"TV_backend.{__name__}")
+
+# share of http requests traced, 0 turns tracing off, 1 traces every request
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# chrome trace event file, one per worker, open it in perfetto or chrome://tracing
+TRACE_FILE = os.getenv(
+    "TRACE_FILE", os.path.join(tempfile.gettempdir(), "tv_backend_trace_{pid}.json")
+)
+
+
+class Trace:
+    """the spans of one sampled request, on its own track in the trace viewer"""
+
+    __slots__ = ("track", "events")
+
+    def __init__(self, track: int):
+        self.track = track
+        self.events: List[dict] = []
+
+    def add(self, name: str, started_ns: int, duration_ns: int, args=None):
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": started_ns / 1000,
+            "dur": duration_ns / 1000,
+            "pid": os.getpid(),
+            "tid": self.track,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class span:
+    """
+    times the block as a span of the current request's trace, costs one context
+    variable lookup when the request isn't sampled
+
+        with span("jwt.decode"):
+            ...
+    """
+
+    __slots__ = ("name", "args", "trace", "started")
+
+    def __init__(self, name: str, **args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.trace = current_trace.get()
+        if self.trace is not None:
+            self.started = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.add(
+                self.name, self.started, perf_counter_ns() - self.started, self.args
+            )
+
+
+def add_span(name: str, started_ns: int, duration_ns: int, **args):
+    """records a span timed elsewhere, e.g. between two sqlalchemy events"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, started_ns, duration_ns, args)
+
+
+class TraceWriter:
+    """
+    appends trace events to `path` from a background thread, the file is a json
+    array without the closing bracket, which the trace viewers accept, so every
+    event is on disk as soon as it's written and a killed worker leaves a valid file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[List[dict]]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="trace-writer", daemon=True
+            )
+            self._thread.start()
+
+    def write(self, events: List[dict]):
+        self._queue.put(events)
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        path = self.path.format(pid=os.getpid())
+        with open(path, "ab") as trace_file:
+            if trace_file.tell() == 0:
+                trace_file.write(b"[\n")
+            while True:
+                events = self._queue.get()
+                if events is None:
+                    return
+                try:
+                    for event in events:
+                        trace_file.write(orjson.dumps(event) + b",\n")
+                    trace_file.flush()
+                except Exception as e:
+                    logger.error(f"Error writing trace: {e.__class__.__name__}:{e}")
+
+
+class TracingMiddleware:
+    """
+    traces `sample_rate` of the http requests, the request itself is the root span
+    and the time spent handing the response to the server is `response.write`,
+    everything the handlers mark with span() or add_span() is nested in between
+    """
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE, writer=None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.writer = writer or TraceWriter(TRACE_FILE)
+        self.writer.start()
+        self._tracks = count(1)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(next(self._tracks))
+        token = current_trace.set(trace)
+        status = None
+
+        async def send_traced(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            started = perf_counter_ns()
+            await send(message)
+            trace.add("response.write", started, perf_counter_ns() - started)
+
+        started = perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            current_trace.reset(token)
+            trace.add(
+                f"{scope['method']} {scope['path']}",
+                started,
+                perf_counter_ns() - started,
+                {"status": status},
+            )
+            self.writer.write(trace.events)